@@ -0,0 +1,306 @@
+# attendance.py
+
+import bisect
+import datetime
+import itertools
+import os
+import time
+from array import array
+from contextlib import ExitStack, contextmanager
+
+from journal import Journal
+
+# Un archivo por mes: attendance/2025-01.jsonl
+ATTENDANCE_DIR = 'attendance'
+
+
+class Session:
+    """
+    Asistencia de una ventana de check-in.
+    - Los conductores del roster se numeran 0..n-1 (índice denso).
+    - Quién confirmó es un bitmap de n bits y la hora de cada check-in
+      un array de doubles, así marcar/consultar es O(1) y listar O(n)
+      sin tocar los registros de conductores.
+    """
+
+    def __init__(self, sid, driver_ids, start, end=None, label=None):
+        self.sid = sid
+        self.driver_ids = [str(uid) for uid in driver_ids]
+        self.index = {uid: i for i, uid in enumerate(self.driver_ids)}
+        self.bits = bytearray((len(self.driver_ids) + 7) // 8)
+        self.times = array('d', bytes(8 * len(self.driver_ids)))
+        self.count = 0
+        self.start = start
+        self.end = end
+        self.label = label
+        self.closed = False
+        self.message = None  # (chat_id, message_id) del mensaje publicado
+
+    def __len__(self):
+        return len(self.driver_ids)
+
+    def _isset(self, i):
+        return self.bits[i >> 3] & (1 << (i & 7))
+
+    def _set(self, i, ts):
+        if self._isset(i):
+            return False
+        self.bits[i >> 3] |= 1 << (i & 7)
+        self.times[i] = ts
+        self.count += 1
+        return True
+
+    def present(self):
+        """[(user_id, hora)] de quienes confirmaron, en orden del roster."""
+        return [(uid, self.times[i]) for i, uid in enumerate(self.driver_ids) if self._isset(i)]
+
+    def absent(self):
+        return [uid for i, uid in enumerate(self.driver_ids) if not self._isset(i)]
+
+    def rows(self):
+        """(sid, inicio, fin, user_id, presente, hora del check-in o None) por conductor."""
+        for i, uid in enumerate(self.driver_ids):
+            present = bool(self._isset(i))
+            yield self.sid, self.start, self.end, uid, present, self.times[i] if present else None
+
+
+class ActiveSessions:
+    """
+    Índice en memoria de las sesiones abiertas (ventana de check-in).
+    - (inicio, sid) en una lista ordenada: las abiertas a una hora
+      dada salen con una búsqueda binaria (open_sessions(), p.ej. al
+      arrancar para retomar sus mensajes).
+    - sid -> (inicio, fin) para saber en O(1) si una sesión concreta
+      acepta taps, sin leer nada de disco.
+    """
+
+    def __init__(self):
+        self._starts = []   # [(inicio, sid)] ordenada
+        self._windows = {}  # sid -> (inicio, fin); fin = inf si no tiene
+
+    def __len__(self):
+        return len(self._windows)
+
+    def add(self, session):
+        end = session.end if session.end is not None else float("inf")
+        self._windows[session.sid] = (session.start, end)
+        bisect.insort(self._starts, (session.start, session.sid))
+
+    def remove(self, sid):
+        window = self._windows.pop(sid, None)
+        if window is not None:
+            i = bisect.bisect_left(self._starts, (window[0], sid))
+            del self._starts[i]
+
+    def is_open(self, sid, now):
+        window = self._windows.get(sid)
+        return window is not None and window[0] <= now < window[1]
+
+    def open_at(self, now):
+        """sids de las sesiones abiertas en `now`."""
+        started = bisect.bisect_right(self._starts, (now, "\uffff"))
+        return [sid for _, sid in self._starts[:started] if self._windows[sid][1] > now]
+
+
+class Attendance:
+    """
+    Sesiones de check-in persistidas en attendance/YYYY-MM.jsonl.
+    - Registros: open (roster y ventana), msg (mensaje publicado),
+      mark (índice + hora) y close.
+    - Al arrancar se releen el mes actual y el anterior (una sesión
+      puede empezar el último día del mes y cerrarse al siguiente).
+    - Las escrituras se hacen desde write_queue: dentro de batch() los
+      journals no hacen fsync por su cuenta y el de los marks de una
+      ráfaga se agrupa con el de la BD (ver register_batch/register_sync).
+    """
+
+    def __init__(self, directory=ATTENDANCE_DIR):
+        self.directory = directory
+        self.sessions = {}      # sid -> Session
+        self.active = ActiveSessions()
+        self._journals = {}     # "YYYY-MM" -> Journal
+        self._seq = {}          # "YYYY-MM" -> itertools.count
+        self._on_close = []
+        self._batch = None      # ExitStack con los journals diferidos
+
+    def register_close(self, fn):
+        """fn(session) se llama cada vez que se cierra una sesión."""
+        self._on_close.append(fn)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        today = datetime.date.today()
+        last_month = today.replace(day=1) - datetime.timedelta(days=1)
+        for month in (f"{last_month:%Y-%m}", f"{today:%Y-%m}"):
+            self.load_month(month)
+
+    def load_month(self, month):
+        """Carga las sesiones de `month` ("YYYY-MM"), si tiene archivo y no está cargado."""
+        if month not in self._journals and os.path.exists(self._path(month)):
+            self._replay(self._open_journal(month))
+
+    def stop(self):
+        for journal in self._journals.values():
+            journal.close()
+        self._journals.clear()
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"{month}.jsonl")
+
+    def _open_journal(self, month):
+        """Abre el journal del mes y devuelve sus registros."""
+        journal = self._journals[month] = Journal(self._path(month))
+        records = journal.open()
+        if self._batch is not None:
+            self._batch.enter_context(journal.defer())
+        opened = [int(r["sid"].split(".")[1]) for r in records if r["op"] == "open"]
+        self._seq[month] = itertools.count(max(opened, default=0) + 1)
+        return records
+
+    def _journal(self, month):
+        if month not in self._journals:
+            self._open_journal(month)
+        return self._journals[month]
+
+    def _replay(self, records):
+        opened = []
+        for record in records:
+            op, sid = record["op"], record["sid"]
+            if op == "open":
+                self.sessions[sid] = Session(sid, record["drivers"], record["start"],
+                                             record.get("end"), record.get("label"))
+                opened.append(sid)
+            elif sid not in self.sessions:
+                continue
+            elif op == "mark":
+                self.sessions[sid]._set(record["i"], record["t"])
+            elif op == "msg":
+                self.sessions[sid].message = (record["chat_id"], record["message_id"])
+            elif op == "close":
+                self.sessions[sid].closed = True
+        # Solo las de este archivo: las de otro mes ya están en el índice
+        for sid in opened:
+            if not self.sessions[sid].closed:
+                self.active.add(self.sessions[sid])
+
+    def months(self):
+        """Meses con archivo de asistencia, en orden ("YYYY-MM")."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(".jsonl")] for name in os.listdir(self.directory)
+                      if name.endswith(".jsonl"))
+
+    def iter_sessions(self, since=None, until=None):
+        """
+        Generador con las sesiones que empezaron en [since, until)
+        (timestamps; None = sin límite), leídas de disco. Lee los
+        archivos mes a mes sin cargarlos enteros: en memoria solo quedan
+        las sesiones del mes que todavía no se cerraron.
+        Las cerradas salen al leer su cierre; las abiertas al final del mes.
+        """
+        first = f"{datetime.date.fromtimestamp(since):%Y-%m}" if since is not None else ""
+        last = f"{datetime.date.fromtimestamp(until):%Y-%m}" if until is not None else "9999"
+        since = since if since is not None else float("-inf")
+        until = until if until is not None else float("inf")
+        for month in self.months():
+            if not first <= month <= last:
+                continue
+            pending = {}
+            for record in Journal.read(self._path(month)):
+                op, sid = record["op"], record["sid"]
+                if op == "open":
+                    if since <= record["start"] < until:
+                        pending[sid] = Session(sid, record["drivers"], record["start"],
+                                               record.get("end"), record.get("label"))
+                elif sid not in pending:
+                    continue
+                elif op == "mark":
+                    pending[sid]._set(record["i"], record["t"])
+                elif op == "close":
+                    session = pending.pop(sid)
+                    session.closed = True
+                    yield session
+            yield from pending.values()
+
+    def export_rows(self, since, until):
+        """Una fila (ver Session.rows()) por conductor y sesión en [since, until)."""
+        for session in self.iter_sessions(since, until):
+            yield from session.rows()
+
+    def _append(self, sid, record):
+        self._journal(sid.split(".")[0]).append(record)
+
+    @contextmanager
+    def batch(self):
+        """
+        Agrupa varios cambios: ningún journal (tampoco uno que se abra
+        durante el lote) hace fsync hasta el sync() de después.
+        """
+        with ExitStack() as stack:
+            for journal in list(self._journals.values()):
+                stack.enter_context(journal.defer())
+            self._batch = stack
+            try:
+                yield
+            finally:
+                self._batch = None
+
+    def sync(self):
+        for journal in list(self._journals.values()):
+            journal.sync()
+
+    def open_session(self, driver_ids, start=None, end=None, label=None):
+        """Crea una sesión para `driver_ids` y la devuelve."""
+        start = start or time.time()
+        month = f"{datetime.datetime.fromtimestamp(start):%Y-%m}"
+        self._journal(month)
+        sid = f"{month}.{next(self._seq[month])}"
+        session = self.sessions[sid] = Session(sid, driver_ids, start, end, label)
+        self.active.add(session)
+        self._append(sid, {"op": "open", "sid": sid, "drivers": session.driver_ids,
+                           "start": start, "end": end, "label": label})
+        return session
+
+    def attach(self, sid, chat_id, message_id):
+        """Asocia la sesión al mensaje publicado en el canal."""
+        self.sessions[sid].message = (chat_id, message_id)
+        self._append(sid, {"op": "msg", "sid": sid, "chat_id": chat_id, "message_id": message_id})
+
+    def is_open(self, sid, now=None):
+        """¿La sesión acepta check-ins ahora? Solo memoria, sin disco."""
+        return self.active.is_open(sid, now or time.time())
+
+    def open_sessions(self, now=None):
+        """Sesiones que aceptan check-ins ahora, en orden de inicio."""
+        return [self.sessions[sid] for sid in self.active.open_at(now or time.time())]
+
+    def mark(self, sid, user_id, ts=None):
+        """
+        Marca el check-in de `user_id` en la sesión.
+        Devuelve True si es nuevo, False si ya estaba y None si el
+        conductor no está en el roster (o la sesión no está abierta).
+        """
+        ts = ts or time.time()
+        if not self.active.is_open(sid, ts):
+            return None
+        session = self.sessions[sid]
+        i = session.index.get(str(user_id))
+        if i is None:
+            return None
+        if not session._set(i, ts):
+            return False
+        self._append(sid, {"op": "mark", "sid": sid, "i": i, "t": ts})
+        return True
+
+    def close(self, sid):
+        session = self.sessions.get(sid)
+        if session is None or session.closed:
+            return
+        session.closed = True
+        self.active.remove(sid)
+        self._append(sid, {"op": "close", "sid": sid})
+        for fn in self._on_close:
+            fn(session)
+
+
+attendance = Attendance()
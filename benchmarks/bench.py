@@ -0,0 +1,276 @@
+# benchmarks/bench.py
+"""
+Microbenchmarks de los caminos calientes: carga/guardado de la BD,
+set_check_in, resolución de rosters y páginas de las listas del admin.
+
+Genera flotas sintéticas (1k-100k conductores) en un directorio temporal,
+así que nunca toca users_db.json.
+
+    python benchmarks/bench.py                       # todo, resultados a stdout
+    python benchmarks/bench.py --quick -o out.json   # solo 1k conductores
+    python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --threshold 0.2
+
+Con --baseline sale con código 1 si algún caso es más lento que el
+baseline en más de --threshold (0.2 = 20%).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FLEET_SIZES = [1000, 10000, 100000]
+ROSTER_SIZES = [50, 500, 2000]
+BACKENDS = ["json", "sqlite"]
+
+FIRST = ["Julio", "María", "José", "Ana", "Luis", "Carmen", "Jorge", "Lucía", "Pedro", "Sofía",
+         "Andrés", "Elena", "Raúl", "Paula", "Iván", "Marta", "Óscar", "Noelia", "Rubén", "Inés"]
+LAST = ["Lusson", "García", "Martínez", "López", "Sánchez", "Pérez", "Gómez", "Fernández",
+        "Díaz", "Álvarez", "Romero", "Navarro", "Torres", "Domínguez", "Vázquez", "Ramos",
+        "Gil", "Serrano", "Blanco", "Muñoz"]
+
+
+def make_fleet(size, seed=1):
+    """users_db.json sintético con `size` conductores aprobados y 1% pendientes."""
+    rng = random.Random(seed)
+    data = {"pending": {}, "approved": {}}
+    for i in range(size):
+        uid = str(100000000 + i)
+        name = f"{rng.choice(FIRST)} {rng.choice(LAST)} {rng.choice(LAST)} {i}"
+        info = {"name": name, "username": f"driver{i}", "id": int(uid), "checked_in": False}
+        section = "pending" if i % 100 == 99 else "approved"
+        data[section][uid] = info
+    return data
+
+
+def make_roster(fleet, size, seed=2):
+    """
+    Roster como lo escribe el admin: 80% nombres exactos, 10% con
+    mayúsculas/espacios cambiados, 10% con errores de tipeo o no registrados.
+    """
+    rng = random.Random(seed)
+    names = [info["name"] for info in fleet["approved"].values()]
+    roster = []
+    for name in rng.sample(names, min(size, len(names))):
+        roll = rng.random()
+        if roll < 0.8:
+            roster.append(name)
+        elif roll < 0.9:
+            roster.append("  " + name.upper().replace(" ", "  "))
+        else:
+            cut = rng.randrange(1, len(name) - 1)
+            roster.append(name[:cut] + name[cut + 1:])
+    return roster
+
+
+# Duración mínima de cada ronda: las operaciones rápidas se repiten
+# dentro de la ronda para que el ruido del reloj no domine
+MIN_ROUND = 0.05
+
+
+def timeit(fn, repeat, number=None):
+    """Tiempos por operación (segundos) de `repeat` rondas de `number` llamadas."""
+    if number is None:
+        start = time.perf_counter()
+        fn()
+        number = max(1, int(MIN_ROUND / max(time.perf_counter() - start, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat, "number": number}
+
+
+def use_store(database, store):
+    # El facade usa un único store global; para cada flota se cambia por
+    # uno nuevo y se fuerzan a reconstruir los índices
+    database._store = store
+    database._index_generation = None
+
+
+def bench_fleet(database, backend, size, repeat, workdir):
+    from json_store import UserStore
+    from sqlite_store import SqliteStore, import_json
+
+    fleet = make_fleet(size)
+    json_path = os.path.join(workdir, f"fleet_{size}.json")
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump(fleet, file, ensure_ascii=False)
+    if backend == "sqlite":
+        path = os.path.join(workdir, f"fleet_{size}.db")
+        import_json(json_path, path)
+
+        def open_store():
+            store = SqliteStore(path)
+            store.open()
+            return store
+    else:
+        path = json_path
+
+        def open_store():
+            store = UserStore(path)
+            store.open()
+            return store
+
+    results = {}
+    prefix = f"{backend}/{size}"
+
+    results[f"{prefix}/open"] = timeit(lambda: use_store(database, open_store()), repeat, number=1)
+    use_store(database, open_store())
+    results[f"{prefix}/load_users"] = timeit(database.load_users, repeat)
+    data = database.load_users()
+    results[f"{prefix}/save_database"] = timeit(lambda: database.save_database(data), repeat, number=1)
+
+    ids = list(database.get_all_users())
+    rng = random.Random(3)
+    sample = [rng.choice(ids) for _ in range(1000)]
+
+    def check_in_burst():
+        # Como write_queue: una ráfaga de taps en un batch y un solo sync
+        with database.batch():
+            for uid in sample:
+                database.set_check_in(uid)
+        database.sync()
+
+    burst = timeit(check_in_burst, repeat)
+    results[f"{prefix}/set_check_in"] = {k: (v / len(sample) if k in ("min", "median") else v)
+                                         for k, v in burst.items()}
+
+    # Índices fríos: la primera consulta tras un cambio de generación
+    def rebuild_indexes():
+        database._index_generation = None
+        database.count_users()
+
+    results[f"{prefix}/build_indexes"] = timeit(rebuild_indexes, max(1, repeat // 2))
+
+    for roster_size in ROSTER_SIZES:
+        if roster_size > size:
+            continue
+        roster = make_roster(fleet, roster_size)
+
+        def resolve():
+            # Igual que start_checkin: se resuelve y se sugiere para los que faltan
+            for name, match in database.resolve_roster(roster):
+                if match is None:
+                    database.suggest_users(name)
+
+        results[f"{prefix}/resolve_roster/{roster_size}"] = timeit(resolve, repeat)
+
+    def render_pages(pages=10):
+        # Como list_users: una página, y las siguientes con el cursor
+        cursor = None
+        for _ in range(pages):
+            users, has_prev, has_next = database.get_users_page(cursor, False, 10)
+            "\n".join(f"{u['name']} (@{u['username']}) - ID: {uid}" for uid, u in users)
+            if not has_next:
+                break
+            cursor = users[-1][0]
+
+    results[f"{prefix}/render_admin_list"] = {
+        k: (v / 10 if k in ("min", "median") else v) for k, v in timeit(render_pages, repeat).items()
+    }
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Imprime la comparación con el baseline y devuelve los casos que
+    empeoraron. Se compara el mínimo de las rondas, que es el menos
+    sensible al ruido de la máquina.
+    """
+    regressions = []
+    print(f"{'caso':45} {'baseline':>12} {'actual':>12} {'ratio':>7}")
+    for name, current in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:45} {'—':>12} {current['min'] * 1e3:10.3f}ms {'nuevo':>7}")
+            continue
+        ratio = current["min"] / base["min"] if base["min"] else float("inf")
+        flag = " ⚠" if ratio > 1 + threshold else ""
+        print(f"{name:45} {base['min'] * 1e3:10.3f}ms {current['min'] * 1e3:10.3f}ms {ratio:6.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=FLEET_SIZES, help="tamaños de flota")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=5, help="rondas por caso")
+    parser.add_argument("--quick", action="store_true", help="solo 1k conductores, 3 rondas")
+    parser.add_argument("-o", "--output", help="archivo JSON de resultados (por defecto stdout)")
+    parser.add_argument("--save-baseline", help="guarda los resultados como baseline")
+    parser.add_argument("--baseline", help="baseline con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.repeat = [1000], 3
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        # database.py abre users_db.json del directorio actual al importarse
+        os.chdir(workdir)
+        import database
+
+        results = {}
+        for backend in args.backends:
+            for size in args.sizes:
+                print(f"… {backend} / {size} conductores", file=sys.stderr)
+                results.update(bench_fleet(database, backend, size, args.repeat, workdir))
+        # Vuelve al directorio original: -o y --baseline son relativos a él
+        os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    elif not args.baseline:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} casos más lentos que el baseline (> {args.threshold:.0%})")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# benchmarks/fake_bot_api.py
+"""
+Bot API falso para pruebas de carga, sin tocar Telegram.
+
+Implementa lo que usa el bot: getMe, getUpdates (long polling),
+setWebhook/deleteWebhook (con push de updates al webhook),
+sendMessage, editMessageText, editMessageReplyMarkup,
+answerCallbackQuery y sendDocument. Cualquier otro método responde ok.
+
+- Latencia configurable por petición (uniforme entre min y max).
+- Respuestas 429 (flood) configurables: con probabilidad fija o al
+  superar un límite de mensajes por segundo, como Telegram.
+- Rechaza textos de más de 4096 caracteres (captions de más de 1024)
+  con el mismo 400 que Telegram; con parse_mode HTML se cuentan sin
+  las etiquetas, como hace Telegram.
+- Guarda cada petición (método, hora, parámetros) para que el generador
+  de carga (loadtest.py) mida tiempos de respuesta.
+
+Se puede usar solo:
+    python benchmarks/fake_bot_api.py --port 8081
+y poner BOT_API_URL = 'http://127.0.0.1:8081/bot' en config.py.
+"""
+
+import argparse
+import asyncio
+import html
+import itertools
+import json
+import random
+import re
+import time
+
+import tornado.httpclient
+import tornado.web
+
+# Parámetros que PTB manda como JSON dentro del formulario
+JSON_PARAMS = {"reply_markup", "entities", "caption_entities", "allowed_updates", "link_preview_options"}
+# Métodos que cuentan para el límite de flood (los que Telegram limita)
+FLOOD_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup", "sendDocument"}
+# Largo máximo de Telegram (después de interpretar el parse_mode)
+MAX_TEXT = 4096
+MAX_CAPTION = 1024
+
+
+class FakeBotAPI:
+    def __init__(self, latency=(0.0, 0.0), flood_prob=0.0, flood_rate=None, retry_after=1, lenient=False):
+        self.latency = latency
+        self.flood_prob = flood_prob
+        self.flood_rate = flood_rate      # mensajes/s permitidos (None = sin límite)
+        self.retry_after = retry_after
+        self.lenient = lenient            # editar mensajes que no conoce (replay)
+        self.requests = []                # (hora, método, parámetros)
+        self.listeners = []               # fn(hora, método, parámetros) por petición
+        self.flooded = 0
+        self.messages = {}                # (chat_id, message_id) -> mensaje
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates = []
+        self._new_update = asyncio.Event()
+        self._webhook = None              # (url, secret)
+        self._window = []                 # horas de los últimos envíos (flood)
+        self._server = None
+        self._http = None
+
+    # --- Servidor -------------------------------------------------------
+
+    def start(self, port=8081, address="127.0.0.1"):
+        app = tornado.web.Application([(r"/bot([^/]+)/(\w+)", _MethodHandler, {"api": self})])
+        self._server = app.listen(port, address)
+        self._http = tornado.httpclient.AsyncHTTPClient()
+        return f"http://{address}:{port}/bot"
+
+    def stop(self):
+        # Suelta el getUpdates que siga esperando
+        self._new_update.set()
+        if self._server:
+            self._server.stop()
+            self._server = None
+
+    # --- Updates --------------------------------------------------------
+
+    def push_update(self, update):
+        """Encola un update (dict sin update_id) y devuelve su update_id."""
+        update = dict(update, update_id=next(self._update_ids))
+        if self._webhook:
+            asyncio.get_running_loop().create_task(self._post_webhook(update))
+        else:
+            self._updates.append(update)
+            self._new_update.set()
+        return update["update_id"]
+
+    async def _post_webhook(self, update):
+        url, secret = self._webhook
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+        try:
+            await self._http.fetch(url, method="POST", headers=headers, body=json.dumps(update))
+        except Exception as e:
+            print(f"Webhook falló para el update {update['update_id']}: {e!r}")
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset", 0))
+        timeout = float(params.get("timeout", 0))
+        limit = int(params.get("limit", 100))
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # --- Mensajes -------------------------------------------------------
+
+    def _chat(self, chat_id):
+        chat_id = int(chat_id)
+        return {"id": chat_id, "type": "private" if chat_id > 0 else "channel", "title": "Canal"}
+
+    def _message(self, params, message_id=None):
+        message = {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": self._chat(params["chat_id"]),
+            "text": params.get("text", ""),
+        }
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+        self.messages[(message["chat"]["id"], message["message_id"])] = message
+        return message
+
+    def _flood(self, method, now):
+        if method not in FLOOD_METHODS:
+            return False
+        if self.flood_prob and random.random() < self.flood_prob:
+            return True
+        if self.flood_rate:
+            self._window = [t for t in self._window if t > now - 1]
+            if len(self._window) >= self.flood_rate:
+                return True
+            self._window.append(now)
+        return False
+
+    @staticmethod
+    def _too_long(params):
+        for field, limit in (("text", MAX_TEXT), ("caption", MAX_CAPTION)):
+            value = params.get(field)
+            if value is None:
+                continue
+            if params.get("parse_mode") == "HTML":
+                value = html.unescape(re.sub(r"<[^>]*>", "", value))
+            if len(value) > limit:
+                return field
+        return None
+
+    async def call(self, method, params):
+        """Devuelve (status, respuesta) para bot.<method>(**params)."""
+        now = time.monotonic()
+        self.requests.append((now, method, params))
+        for listener in self.listeners:
+            listener(now, method, params)
+        low, high = self.latency
+        if high:
+            await asyncio.sleep(random.uniform(low, high))
+
+        if self._flood(method, now):
+            self.flooded += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        too_long = method in ("sendMessage", "sendDocument", "editMessageText") and self._too_long(params)
+        if too_long:
+            return 400, {"ok": False, "error_code": 400,
+                         "description": f"Bad Request: message {'caption ' if too_long == 'caption' else ''}is too long"}
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+                      "can_join_groups": True, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "setWebhook":
+            self._webhook = (params["url"], params.get("secret_token"))
+            result = True
+        elif method == "deleteWebhook":
+            self._webhook = None
+            result = True
+        elif method in ("sendMessage", "sendDocument"):
+            result = self._message(params)
+        elif method in ("editMessageText", "editMessageReplyMarkup"):
+            key = (int(params["chat_id"]), int(params["message_id"]))
+            if key not in self.messages and not self.lenient:
+                return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message to edit not found"}
+            old = self.messages.get(key, {"text": None})
+            if method == "editMessageText" and old["text"] == params.get("text") \
+                    and old.get("reply_markup") == params.get("reply_markup"):
+                return 400, {"ok": False, "error_code": 400,
+                             "description": "Bad Request: message is not modified"}
+            if method == "editMessageReplyMarkup":
+                params = dict(params, text=old["text"])
+            result = self._message(params, message_id=key[1])
+        else:
+            result = True
+        return 200, {"ok": True, "result": result}
+
+
+class _MethodHandler(tornado.web.RequestHandler):
+    def initialize(self, api):
+        self.api = api
+
+    def _params(self):
+        # PTB manda los parámetros como formulario; los que no son texto
+        # (reply_markup, ...) van como JSON
+        if self.request.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(self.request.body or b"{}")
+        params = {}
+        for name, values in self.request.body_arguments.items():
+            value = values[-1].decode()
+            params[name] = json.loads(value) if name in JSON_PARAMS else value
+        for name, values in self.request.query_arguments.items():
+            params.setdefault(name, values[-1].decode())
+        for name in self.request.files:
+            params[name] = "<archivo>"
+        return params
+
+    async def get(self, token, method):
+        await self.post(token, method)
+
+    async def post(self, token, method):
+        status, body = await self.api.call(method, self._params())
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.0, 0.0], metavar=("MIN", "MAX"),
+                        help="latencia por petición en segundos")
+    parser.add_argument("--flood-prob", type=float, default=0.0, help="probabilidad de responder 429")
+    parser.add_argument("--flood-rate", type=float, help="mensajes/s antes de responder 429")
+    args = parser.parse_args()
+
+    async def serve():
+        api = FakeBotAPI(tuple(args.latency), args.flood_prob, args.flood_rate)
+        print(f"Bot API falso en {api.start(args.port)}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# benchmarks/loadtest.py
+"""
+Prueba de carga de punta a punta contra el Bot API falso.
+
+1) Genera una flota sintética en un directorio temporal (ver bench.py).
+2) Arranca fake_bot_api.py y el bot (main.build_application) apuntando
+   a él, en polling o webhook.
+3) Programa un check-in para --drivers conductores en el scheduler
+   (para ya, como uno creado desde el menú) y simula sus taps en "do_checkin" repartidos en --ramp
+   segundos. En paralelo, un admin recorre el menú (/start, listas,
+   páginas, pendientes).
+4) Para el bot y revisa en disco (attendance/) que cada tap confirmado
+   esté guardado.
+
+Reporta p50/p95/p99 de tap → respuesta, taps sin respuesta, check-ins
+confirmados que no llegaron a disco, taps/s y el tiempo de las
+respuestas al admin.
+
+    python benchmarks/loadtest.py --drivers 2000 --ramp 10
+    python benchmarks/loadtest.py --mode webhook --latency 0.05 0.2 --flood-rate 30
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from bench import make_fleet  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.api = FakeBotAPI(tuple(args.latency), args.flood_prob, args.flood_rate)
+        self.api.listeners.append(self._on_request)
+        self.tap_sent = {}        # callback_query id -> hora
+        self.tap_answered = {}    # callback_query id -> (hora, texto)
+        self.tap_driver = {}      # callback_query id -> user_id
+        self.admin_waiter = None  # Future de la próxima respuesta al admin
+        self.admin_latencies = []
+
+    def _on_request(self, now, method, params):
+        if method == "answerCallbackQuery":
+            self.tap_answered.setdefault(params["callback_query_id"], (now, params.get("text")))
+        chat_id = params.get("chat_id")
+        if chat_id is None:
+            return
+        if str(chat_id) == str(self.admin_id) and self.admin_waiter and not self.admin_waiter.done():
+            self.admin_waiter.set_result(now)
+
+    # --- Updates simulados -----------------------------------------------
+
+    def _user(self, user_id, name="Driver"):
+        return {"id": int(user_id), "is_bot": False, "first_name": name}
+
+    def _tap(self, user_id, message, data, query_id):
+        return {"callback_query": {
+            "id": query_id,
+            "from": self._user(user_id),
+            "chat_instance": "1",
+            "data": data,
+            "message": message,
+        }}
+
+    async def _admin_step(self, update):
+        self.admin_waiter = asyncio.get_running_loop().create_future()
+        start = time.monotonic()
+        self.api.push_update(update)
+        try:
+            answered = await asyncio.wait_for(self.admin_waiter, 10)
+            self.admin_latencies.append(answered - start)
+        except asyncio.TimeoutError:
+            self.admin_latencies.append(None)
+
+    async def admin_walker(self, stop):
+        """Recorre el menú admin en bucle mientras dura la ráfaga."""
+        admin = self._user(self.admin_id, "Admin")
+        chat = {"id": self.admin_id, "type": "private"}
+        message_ids = iter(range(10 ** 6, 10 ** 7))
+        last_menu = 0
+        while not stop.is_set():
+            await self._admin_step({"message": {
+                "message_id": next(message_ids), "date": int(time.time()), "chat": chat,
+                "from": admin, "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            }})
+            menu = await self._last_keyboard(self.admin_id, after=last_menu)
+            if menu is None:
+                continue
+            last_menu = menu["message_id"]
+            for data in ["list_users", "pending_requests", "edit_user", "back"]:
+                if stop.is_set():
+                    break
+                await self._admin_step({"callback_query": {
+                    "id": f"admin-{time.monotonic()}", "from": admin, "chat_instance": "2",
+                    "data": data, "message": menu,
+                }})
+                await asyncio.sleep(self.args.admin_think)
+
+    async def tap_storm(self, driver_ids, message, data):
+        rng = random.Random(4)
+        offsets = sorted(rng.uniform(0, self.args.ramp) for _ in driver_ids)
+        start = time.monotonic()
+        for i, (user_id, offset) in enumerate(zip(driver_ids, offsets)):
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            query_id = f"tap-{i}"
+            self.tap_driver[query_id] = user_id
+            self.tap_sent[query_id] = time.monotonic()
+            self.api.push_update(self._tap(user_id, message, data, query_id))
+            # Algunos conductores pulsan dos veces
+            if rng.random() < self.args.double_tap:
+                self.tap_driver[f"{query_id}-bis"] = user_id
+                self.api.push_update(self._tap(user_id, message, data, f"{query_id}-bis"))
+
+    # --- Escenario --------------------------------------------------------
+
+    async def _last_keyboard(self, chat_id, after=0, timeout=10):
+        """
+        El último mensaje con botones del chat, tal como lo guardó el API
+        falso (se guarda tras la latencia simulada, por eso se espera).
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            found = [(message_id, message) for (chat, message_id), message in self.api.messages.items()
+                     if chat == chat_id and message_id > after and message.get("reply_markup")]
+            if found:
+                return max(found, key=lambda item: item[0])[1]
+            await asyncio.sleep(0.01)
+        return None
+
+    async def run(self):
+        import config
+        import main
+        from attendance import Attendance
+        from database import get_all_users
+        from scheduler import scheduler
+
+        self.admin_id, self.channel_id = config.ADMIN_ID, config.CHANNEL_ID
+        base_url = self.api.start(self.args.port)
+        app = main.build_application(base_url=base_url)
+        await app.initialize()
+        await app.post_init(app)
+        await app.start()
+        if self.args.mode == "webhook":
+            await app.updater.start_webhook(
+                listen="127.0.0.1", port=self.args.port + 1, url_path="hook",
+                webhook_url=f"http://127.0.0.1:{self.args.port + 1}/hook", secret_token="loadtest"
+            )
+        else:
+            await app.updater.start_polling(poll_interval=0, timeout=10)
+
+        # Programa el check-in para ya: lo publica el scheduler, por el
+        # mismo camino que en producción (cola de envío, outbox, límites
+        # del Bot API)
+        users = get_all_users()
+        driver_ids = list(users)[:self.args.drivers]
+        try:
+            now = datetime.datetime.now()
+            scheduler.add(
+                "checkin",
+                now,
+                data={"roster_list": [users[uid]["name"] for uid in driver_ids],
+                      "end": (now + datetime.timedelta(hours=1)).timestamp()},
+                label="Check-in de la prueba de carga"
+            )
+            post = await self._last_keyboard(self.channel_id)
+            if post is None:
+                # P.ej. un mensaje de más de 4096 caracteres (el API falso
+                # responde 400 como Telegram; el motivo queda en el log)
+                raise RuntimeError("El bot no publicó el check-in en el canal")
+            data = post["reply_markup"]["inline_keyboard"][0][0]["callback_data"]
+
+            stop = asyncio.Event()
+            walker = asyncio.create_task(self.admin_walker(stop))
+            started = time.monotonic()
+            await self.tap_storm(driver_ids, post, data)
+            # Espera a que se respondan todos los taps (o al timeout)
+            deadline = time.monotonic() + self.args.drain
+            while len(self.tap_answered) < len(self.tap_sent) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            finished = time.monotonic()
+            stop.set()
+            await walker
+        finally:
+            await app.updater.stop()
+            await app.stop()
+            await app.post_shutdown(app)
+            await app.shutdown()
+            self.api.stop()
+
+        # Lo que quedó en disco
+        sid = data.partition(":")[2]
+        on_disk = set()
+        for session in Attendance().iter_sessions():
+            if session.sid == sid:
+                on_disk = {uid for uid, _ in session.present()}
+        return self.report(finished - started, on_disk)
+
+    def report(self, elapsed, on_disk):
+        latencies = [self.tap_answered[q][0] - sent for q, sent in self.tap_sent.items() if q in self.tap_answered]
+        # Conductores a los que el bot les confirmó el check-in (en el
+        # primer tap o en el repetido)
+        confirmed = {self.tap_driver[q] for q, (_, text) in self.tap_answered.items()
+                     if text == "¡Check-in registrado!" and q in self.tap_driver}
+        admin = [t for t in self.admin_latencies if t is not None]
+        methods = {}
+        for _, method, _ in self.api.requests:
+            methods[method] = methods.get(method, 0) + 1
+        ms = lambda value: round(value * 1000, 1) if value is not None else None  # noqa: E731
+        return {
+            "drivers": self.args.drivers,
+            "mode": self.args.mode,
+            "taps": len(self.tap_sent),
+            "answered": len(latencies),
+            "unanswered": len(self.tap_sent) - len(latencies),
+            "tap_to_answer_ms": {
+                "p50": ms(percentile(latencies, 50)),
+                "p95": ms(percentile(latencies, 95)),
+                "p99": ms(percentile(latencies, 99)),
+                "max": ms(max(latencies, default=None)),
+            },
+            "throughput_taps_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+            "confirmed": len(confirmed),
+            "lost_check_ins": len(confirmed - on_disk),
+            "admin_steps": len(self.admin_latencies),
+            "admin_timeouts": len(self.admin_latencies) - len(admin),
+            "admin_response_ms": {
+                "p50": ms(percentile(admin, 50)),
+                "p95": ms(percentile(admin, 95)),
+                "mean": ms(statistics.mean(admin)) if admin else None,
+            },
+            "api_requests": methods,
+            "api_429": self.api.flooded,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=2000, help="conductores en el roster (todos pulsan)")
+    parser.add_argument("--fleet", type=int, default=5000, help="conductores registrados en total")
+    parser.add_argument("--ramp", type=float, default=10.0, help="segundos en los que llegan los taps")
+    parser.add_argument("--double-tap", type=float, default=0.05, help="fracción que pulsa dos veces")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--port", type=int, default=8081, help="puerto del Bot API falso (webhook: +1)")
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.02, 0.08], metavar=("MIN", "MAX"),
+                        help="latencia del Bot API falso en segundos")
+    parser.add_argument("--flood-prob", type=float, default=0.0, help="probabilidad de 429 por envío")
+    parser.add_argument("--flood-rate", type=float, help="envíos/s antes de responder 429")
+    parser.add_argument("--admin-think", type=float, default=0.5, help="pausa del admin entre pasos")
+    parser.add_argument("--drain", type=float, default=30.0, help="segundos de espera por respuestas")
+    parser.add_argument("-o", "--output", help="archivo JSON con el reporte")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as workdir:
+        # El bot guarda todo en el directorio actual (users_db.json, journals...)
+        os.chdir(workdir)
+        with open("users_db.json", "w", encoding="utf-8") as file:
+            json.dump(make_fleet(max(args.fleet, args.drivers)), file, ensure_ascii=False)
+        report = asyncio.run(LoadTest(args).run())
+        # Vuelve al directorio original: -o es relativo a él
+        os.chdir(cwd)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    return 1 if report["lost_check_ins"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+# benchmarks/replay.py
+"""
+Reproduce una grabación de updates (ver recorder.py) contra una copia
+de la BD, para evaluar cambios de rendimiento con ráfagas reales
+(roster del admin, publicación en el canal, tormenta de taps).
+
+1) Copia los datos del bot (users_db.json y su journal o users.db,
+   shifts.json, attendance/) de --data-dir a un directorio temporal.
+   No se copian outbox ni schedule: lo que el scheduler publique por su
+   cuenta no se reproduce. Las sesiones de check-in de la copia se
+   rebobinan al inicio de la grabación (se descartan los check-ins y
+   cierres posteriores) y se corren al reloj del replay, así los taps
+   grabados encuentran la sesión abierta y se marcan de verdad; la
+   copia puede ser de antes o de después de la grabación.
+2) Arranca el bot contra el Bot API falso (fake_bot_api.py) y le entrega
+   cada update grabado respetando los tiempos originales divididos por
+   --speed (0 = lo más rápido posible), pasando por el mismo update
+   processor que en producción.
+3) Reporta la latencia de cada update (llegada → fin de los handlers)
+   por tipo de update, los errores y el diff de la BD y de las sesiones
+   de check-in entre el inicio y el final.
+
+    python benchmarks/replay.py recordings/updates-2026-10-18.jsonl.gz
+    python benchmarks/replay.py rec.jsonl.gz --speed 10 --data-dir backup/ -o replay.json
+    python benchmarks/replay.py rec.jsonl.gz --key <RECORD_ANONYMIZE_KEY> --baseline replay.json
+
+Con --key se seudonimiza la copia con la misma clave de la grabación,
+para que los ids coincidan. Con --baseline se compara el estado final
+con el de otro reporte (p.ej. antes de un cambio) y sale con código 1
+si difiere.
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+# Segundos entre preparar la copia y entregar el primer update (lo que
+# tarda en arrancar el bot); los horarios de las sesiones se corren a ese
+# momento
+REPLAY_WARMUP = 3.0
+
+
+def copy_data(data_dir, workdir):
+    from config import DB_FILE, SQLITE_FILE
+
+    names = [DB_FILE, DB_FILE + ".journal", DB_FILE + ".journal.1",
+             SQLITE_FILE, SQLITE_FILE + "-wal", "shifts.json"]
+    copied = []
+    for name in names:
+        source = os.path.join(data_dir, name)
+        if os.path.exists(source):
+            shutil.copy2(source, os.path.join(workdir, name))
+            copied.append(name)
+    if os.path.isdir(os.path.join(data_dir, "attendance")):
+        shutil.copytree(os.path.join(data_dir, "attendance"), os.path.join(workdir, "attendance"))
+        copied.append("attendance/")
+    return copied
+
+
+def pseudonymize_attendance(pseudonymizer, directory="attendance"):
+    # Solo los registros "open" llevan user_ids; las marcas van por índice
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        with open(path, encoding="utf-8") as file:
+            records = [json.loads(line) for line in file if line.strip()]
+        for record in records:
+            if record["op"] == "open":
+                record["drivers"] = [str(pseudonymizer.id(uid)) for uid in record["drivers"]]
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+
+
+def rewind_attendance(first, replay_start, speed, directory="attendance"):
+    """
+    Deja las sesiones como estaban al empezar la grabación (`first`) y
+    lleva sus horarios al reloj del replay: una hora t de la grabación
+    pasa a replay_start + (t - first) / speed, igual que los updates.
+    Sin esto las ventanas de la copia ya vencieron (is_open mira la
+    hora real) y cada tap grabado se rechazaría sin tocar el disco.
+    """
+    scale = speed or 1.0
+
+    def moved(t):
+        return replay_start + (t - first) / scale
+
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        with open(path, encoding="utf-8") as file:
+            records = [json.loads(line) for line in file if line.strip()]
+        ends = {record["sid"]: record.get("end") for record in records if record["op"] == "open"}
+        kept = []
+        for record in records:
+            op, sid = record["op"], record["sid"]
+            if op == "mark":
+                if record["t"] >= first:
+                    continue  # Check-in que la grabación va a repetir
+                record["t"] = moved(record["t"])
+            elif op == "close" and (ends.get(sid) is None or ends[sid] > first):
+                continue  # Seguía abierta cuando empezó la grabación
+            elif op == "open":
+                record["start"] = moved(record["start"])
+                if not speed:
+                    # Sin esperas todos los updates llegan al arrancar
+                    record["start"] = min(record["start"], replay_start)
+                if record.get("end") is not None:
+                    record["end"] = moved(record["end"])
+            kept.append(record)
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(record) + "\n" for record in kept)
+
+
+def pseudonymize_users(database, pseudonymizer):
+    data = database.load_users()
+    renamed = {}
+    for section, users in data.items():
+        renamed[section] = {}
+        for uid, info in users.items():
+            new_uid = str(pseudonymizer.id(uid))
+            info = dict(info)
+            if "id" in info:
+                info["id"] = int(new_uid)
+            renamed[section][new_uid] = info
+    database.save_database(renamed)
+
+
+def read_records(paths):
+    from recorder import UpdateRecorder
+
+    records = []
+    for path in paths:
+        records.extend(UpdateRecorder.read(path))
+    records.sort(key=lambda record: record["t"])
+    return records
+
+
+def update_kind(update):
+    if update.callback_query:
+        return "callback:" + (update.callback_query.data or "").partition(":")[0]
+    message = update.effective_message
+    if message and message.text:
+        return "command:" + message.text.split()[0].split("@")[0] if message.text.startswith("/") else "text"
+    return "other"
+
+
+def snapshot_state(database):
+    """Copia de los usuarios y de las sesiones de check-in en disco."""
+    from attendance import Attendance
+
+    users = json.loads(json.dumps(database.load_users()))
+    sessions = {}
+    for session in Attendance().iter_sessions():
+        sessions[session.sid] = {
+            "label": session.label,
+            "drivers": len(session),
+            "present": sorted(uid for uid, _ in session.present()),
+            "closed": session.closed,
+        }
+    return {"users": users, "sessions": sessions}
+
+
+def diff_state(before, after):
+    diff = {}
+    for section in ("approved", "pending"):
+        old, new = before["users"].get(section, {}), after["users"].get(section, {})
+        changed = {}
+        for uid in sorted(set(old) & set(new)):
+            fields = {field: [old[uid].get(field), new[uid].get(field)]
+                      for field in set(old[uid]) | set(new[uid]) if old[uid].get(field) != new[uid].get(field)}
+            if fields:
+                changed[uid] = fields
+        diff[section] = {
+            "added": sorted(set(new) - set(old)),
+            "removed": sorted(set(old) - set(new)),
+            "changed": changed,
+        }
+    sessions = {}
+    for sid, session in after["sessions"].items():
+        old = before["sessions"].get(sid)
+        if old is None:
+            sessions[sid] = dict(session, present=len(session["present"]), new=True)
+        elif old != session:
+            sessions[sid] = dict(session, present=len(session["present"]),
+                                 new_marks=len(set(session["present"]) - set(old["present"])))
+    diff["sessions"] = sessions
+    return diff
+
+
+def state_digest(state):
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def replay(records, args, replay_start):
+    import main
+    from attendance import attendance
+    from telegram import Update
+
+    api = FakeBotAPI(tuple(args.latency), lenient=True)
+    app = main.build_application(base_url=api.start(args.port))
+    errors = []
+
+    async def on_error(update, context):
+        errors.append(f"{update_kind(update) if isinstance(update, Update) else '-'}: {context.error!r}")
+
+    app.add_error_handler(on_error)
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    # El bot solo carga el mes actual y el anterior; la grabación puede
+    # ser de otro mes
+    for month in attendance.months():
+        attendance.load_month(month)
+    await asyncio.sleep(max(0.0, replay_start - time.time()))
+
+    latencies = {}  # tipo -> [segundos]
+    lag = []        # atraso de la entrega respecto del horario grabado
+
+    async def deliver(update):
+        start = time.monotonic()
+        # Igual que Application al sacar un update de la cola
+        await app.update_processor.process_update(update, app.process_update(update))
+        latencies.setdefault(update_kind(update), []).append(time.monotonic() - start)
+
+    tasks = []
+    started = time.monotonic()
+    first = records[0]["t"]
+    try:
+        for record in records:
+            if args.speed:
+                target = started + (record["t"] - first) / args.speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag.append(max(0.0, -delay))
+            update = Update.de_json(record["update"], app.bot)
+            tasks.append(asyncio.create_task(deliver(update)))
+            if not args.speed:
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    finally:
+        await app.stop()
+        await app.post_shutdown(app)
+        await app.shutdown()
+        api.stop()
+
+    methods = {}
+    for _, method, _ in api.requests:
+        methods[method] = methods.get(method, 0) + 1
+    return latencies, lag, errors, elapsed, methods
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+        "mean_ms": round(statistics.mean(values) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="archivos .jsonl.gz grabados")
+    parser.add_argument("--speed", type=float, default=1.0, help="aceleración (1 = tiempo real, 0 = sin esperas)")
+    parser.add_argument("--data-dir", default=ROOT, help="directorio con los datos del bot a copiar")
+    parser.add_argument("--key", help="clave RECORD_ANONYMIZE_KEY de la grabación")
+    parser.add_argument("--port", type=int, default=8091, help="puerto del Bot API falso")
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.0, 0.0], metavar=("MIN", "MAX"),
+                        help="latencia del Bot API falso en segundos")
+    parser.add_argument("--baseline", help="reporte de otro replay con el que comparar el estado final")
+    parser.add_argument("-o", "--output", help="archivo JSON con el reporte")
+    args = parser.parse_args(argv)
+
+    recordings = [os.path.abspath(path) for path in args.recordings]
+    data_dir = os.path.abspath(args.data_dir)
+    records = read_records(recordings)
+    if not records:
+        print("La grabación está vacía")
+        return 1
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="replay_") as workdir:
+        copied = copy_data(data_dir, workdir)
+        # El bot guarda todo en el directorio actual
+        os.chdir(workdir)
+        if args.key:
+            from recorder import Pseudonymizer
+            pseudonymizer = Pseudonymizer(args.key)
+            pseudonymize_attendance(pseudonymizer)
+        import database
+        if args.key:
+            pseudonymize_users(database, pseudonymizer)
+            database.sync()
+
+        replay_start = time.time() + REPLAY_WARMUP
+        rewind_attendance(records[0]["t"], replay_start, args.speed)
+
+        before = snapshot_state(database)
+        latencies, lag, errors, elapsed, methods = asyncio.run(replay(records, args, replay_start))
+        after = snapshot_state(database)
+        # Vuelve al directorio original: -o y --baseline son relativos a él
+        os.chdir(cwd)
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    report = {
+        "recordings": args.recordings,
+        "copied": copied,
+        "speed": args.speed,
+        "updates": len(records),
+        "recorded_span_s": round(records[-1]["t"] - records[0]["t"], 1),
+        "replay_s": round(elapsed, 1),
+        "delivery_lag_max_ms": round(max(lag, default=0.0) * 1000, 1),
+        "latency": summarize(all_latencies),
+        "latency_by_kind": {kind: summarize(values) for kind, values in sorted(latencies.items())},
+        "errors": errors,
+        "api_requests": methods,
+        "db_diff": diff_state(before, after),
+        "final_state_digest": state_digest(after),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["final_state_digest"] != report["final_state_digest"]:
+            print("\nEl estado final difiere del baseline")
+            return 1
+        print("\nEl estado final coincide con el baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,11 +8,26 @@ from telegram import (
 from telegram.ext import (
     CallbackContext,
     ContextTypes,
-    CallbackQueryHandler
+    CommandHandler
 )
-from config import CHANNEL_ID
-from database import load_users, save_database
+from config import ADMIN_ID, CHANNEL_ID
+from database import get_user, resolve_roster, suggest_users
+from live_message import live_messages
+from send_queue import send_queue, PRIORITY_ADMIN, PRIORITY_CHANNEL
+from outbox import outbox
+from scheduler import scheduler
+from write_queue import write_queue
+from attendance import attendance
+from dispatcher import dispatcher
 import datetime
+import html
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Telegram acepta hasta 4096 caracteres por mensaje; se deja margen
+# (cuenta en UTF-16 y sin las etiquetas HTML, así que len() ya sobra)
+MAX_MESSAGE_LENGTH = 4000
 
 # Usamos context.user_data en vez de variables globales
 # para almacenar la lista y la fecha/hora temporal.
@@ -26,37 +41,38 @@ async def start_checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     4) Luego pedimos fecha/hora de inicio para programar el check-in.
     """
     message = update.message.text
-    user_db = load_users()  # Carga la BD completa
 
     # Guardamos la lista cruda en user_data para siguientes pasos.
     roster_list = [line.strip() for line in message.split('\n') if line.strip()]
     context.user_data["roster_list"] = roster_list  # Almacenamos la lista
 
-    # Verificamos qué nombres coinciden con la BD
+    # Verificamos qué nombres coinciden con la BD (índice por nombre normalizado)
     detected, unregistered = [], []
-    for name in roster_list:
-        # Ojo: 'approved' es un dict con claves = user_id y valores = datos
-        match = next(
-            (user_info for user_info in user_db["approved"].values()
-             if user_info["name"] == name),
-            None
-        )
+    for name, match in resolve_roster(roster_list):
         if match:
-            detected.append(f"{name} (@{match['username']})")
+            detected.append(f"{html.escape(name)} (@{html.escape(str(match['username']))})")
         else:
-            unregistered.append(name)
-
-    # Armamos el texto de revisión
-    review_text = "<b>Revisión de nombres detectados:</b>\n\n"
-    if detected:
-        review_text += "<b>Registrados:</b>\n" + "\n".join(detected)
-    else:
-        review_text += "No hay usuarios registrados.\n"
-
+            # Sugerimos los conductores con nombre más parecido
+            suggestions = suggest_users(name)
+            if suggestions:
+                guesses = ", ".join(html.escape(u["name"]) for u in suggestions)
+                unregistered.append(f"{html.escape(name)} → ¿Quisiste decir: {guesses}?")
+            else:
+                unregistered.append(html.escape(name))
+
+    # Armamos el texto de revisión. Los nombres vienen del admin y de
+    # los conductores: van escapados (parse_mode HTML) y las listas se
+    # cortan para no pasar el límite de Telegram; los no registrados,
+    # que son los que hay que corregir, tienen media página asegurada.
     if unregistered:
-        review_text += "\n\n<b>No registrados:</b>\n" + "\n".join(unregistered)
+        missing_text = fit_lines("\n\n<b>No registrados:</b>\n", unregistered, limit=MAX_MESSAGE_LENGTH // 2)
     else:
-        review_text += "\n\nTodos están registrados."
+        missing_text = "\n\nTodos están registrados."
+    head = "<b>Revisión de nombres detectados:</b>\n\n"
+    if detected:
+        review_text = fit_lines(head + "<b>Registrados:</b>\n", detected, missing_text)
+    else:
+        review_text = head + "No hay usuarios registrados.\n" + missing_text
 
     # Mostramos botones para continuar
     keyboard = [
@@ -81,13 +97,10 @@ async def ask_date_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         "Formato: YYYY-MM-DD HH:MM-HH:MM\n\n"
         "Ejemplo: 2025-01-10 07:00-08:30"
     )
-    context.user_data["waiting_for_date_time"] = True  # ¡Clave!
+    context.user_data["state"] = "date_time"  # ¡Clave!
 
 async def handle_date_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not context.user_data.get("waiting_for_date_time"):
-        return  # Ignora si no estamos esperando fecha/hora
-
-    context.user_data["waiting_for_date_time"] = False
+    # Solo llega aquí con state == "date_time" (ver dispatcher.py)
     user_input = update.message.text.strip()
     try:
         date_part, time_part = user_input.split(" ")
@@ -101,19 +114,6 @@ async def handle_date_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
         end_dt = datetime.datetime.combine(date_obj, end_time)
         if start_dt >= end_dt:
             raise ValueError("La hora de inicio debe ser anterior a la de fin.")
-
-        context.user_data["start_dt"] = start_dt
-        context.user_data["end_dt"] = end_dt
-
-        keyboard = [
-            [InlineKeyboardButton("✅ Confirmar", callback_data="confirm_roster_schedule")],
-            [InlineKeyboardButton("❌ Cancelar", callback_data="cancel_roster_setup")]
-        ]
-        await update.message.reply_text(
-            f"Fecha: {date_part}\nHora inicio: {start_str}\nHora fin: {end_str}\n\n"
-            "¿Deseas programar este rango?",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
     except Exception as e:
         await update.message.reply_text(
             "❌ Formato inválido.\n"
@@ -121,88 +121,263 @@ async def handle_date_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Ejemplo: `2025-01-10 07:00-08:30`",
             parse_mode="Markdown"
         )
-        context.user_data["waiting_for_date_time"] = True  # reintentamos
+        context.user_data["state"] = "date_time"  # reintentamos
+        return
+
+    # Un rango que ya terminó publicaría un check-in cerrado
+    if end_dt <= datetime.datetime.now():
+        await update.message.reply_text(
+            "❌ Ese rango ya terminó. Indica una fecha/hora futura.\n"
+            "Formato: YYYY-MM-DD HH:MM-HH:MM"
+        )
+        context.user_data["state"] = "date_time"  # reintentamos
+        return
+
+    context.user_data["start_dt"] = start_dt
+    context.user_data["end_dt"] = end_dt
+
+    keyboard = [
+        [InlineKeyboardButton("✅ Confirmar", callback_data="confirm_roster_schedule")],
+        [InlineKeyboardButton("❌ Cancelar", callback_data="cancel_roster_setup")]
+    ]
+    await update.message.reply_text(
+        f"Fecha: {date_part}\nHora inicio: {start_str}\nHora fin: {end_str}\n\n"
+        "¿Deseas programar este rango?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
 
 
 async def confirm_roster_schedule(update, context: CallbackContext) -> None:
     """
-    1) Usamos JobQueue para programar el envío de check-in al canal.
-    2) El jobQueue llamará a send_checkin_message en la hora indicada.
+    1) Guardamos el check-in en el scheduler persistente (sobrevive a
+       reinicios del bot).
+    2) A la hora indicada el scheduler llamará a send_checkin_message.
     """
     query = update.callback_query
     await query.answer()
 
-    dt = context.user_data.get("checkin_datetime")
+    start_dt = context.user_data.get("start_dt")
+    end_dt = context.user_data.get("end_dt")
     roster_list = context.user_data.get("roster_list", [])
 
-    if not dt or not roster_list:
+    if not start_dt or not roster_list:
         await query.message.edit_text("No hay fecha/hora o lista. Operación cancelada.")
         return
 
     # Programamos el job
-    job_queue = context.job_queue
-    job_queue.run_once(
-        send_checkin_message,
-        when=dt,
-        data={"roster_list": roster_list},
-        name="checkin_job"
+    job_id = scheduler.add(
+        "checkin",
+        start_dt,
+        data={"roster_list": roster_list, "end": end_dt.timestamp()},
+        label=f"Check-in {start_dt:%Y-%m-%d %H:%M}-{end_dt:%H:%M} ({len(roster_list)} nombres)"
     )
 
     await query.message.edit_text(
-        f"✅ Check-in programado para {dt}. Se enviará al canal en la hora indicada.",
-        parse_mode="HTML"
+        f"✅ Check-in #{job_id} programado para {start_dt:%Y-%m-%d %H:%M}. "
+        "Se enviará al canal en la hora indicada.\n\n"
+        "Usa /programados para verlos y /cancelar <id> para cancelarlo."
     )
 
 
+# /programados — lista los check-ins programados (solo admin)
+async def list_scheduled(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    jobs = scheduler.pending()
+    if not jobs:
+        await update.message.reply_text("No hay check-ins programados.")
+        return
+
+    lines = ["🗓 Check-ins programados:"]
+    for job in jobs[:50]:
+        lines.append(f"#{job['id']} – {job['label']}")
+    if len(jobs) > 50:
+        lines.append(f"... y {len(jobs) - 50} más")
+    await update.message.reply_text("\n".join(lines))
+
+
+# /cancelar <id> — cancela un check-in programado (solo admin)
+async def cancel_scheduled(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    if not context.args:
+        await update.message.reply_text("Uso: /cancelar <id>")
+        return
+
+    job_id = context.args[0].lstrip("#")
+    if scheduler.cancel(job_id):
+        await update.message.reply_text(f"❌ Check-in #{job_id} cancelado.")
+    else:
+        await update.message.reply_text(f"No existe el check-in #{job_id}.")
+
+
 async def send_checkin_message(context: CallbackContext):
     """
     Se ejecuta automáticamente a la hora programada.
     Envía el mensaje de check-in al canal, mencionando a cada usuario si corresponde.
     """
-    job_data = context.job.data  # data={"roster_list": ...}
-    roster_list = job_data["roster_list"]
+    job_data = context.job.data  # data={"roster_list": ..., "end": ...}
+    end = job_data.get("end")
+    if end and end <= datetime.datetime.now().timestamp():
+        # Llegó tarde (el bot estuvo caído): la ventana ya terminó y se
+        # publicaría un check-in que rechaza todos los taps
+        await outbox.notify(
+            "send_message",
+            PRIORITY_ADMIN,
+            chat_id=ADMIN_ID,
+            text=f"⚠️ No se publicó el check-in #{job_data['job_id']}: su ventana terminó "
+                 f"a las {datetime.datetime.fromtimestamp(end):%Y-%m-%d %H:%M} "
+                 "mientras el bot no estaba corriendo."
+        )
+        return
+    await publish_checkin(job_data["roster_list"], end)
 
-    user_db = load_users()
 
-    # Construimos menciones
-    mentions = []
-    for name in roster_list:
-        match = next(
-            (user_info for user_info in user_db["approved"].values()
-             if user_info["name"] == name),
-            None
-        )
+async def publish_checkin(roster_list, end=None):
+    """
+    Publica el check-in de `roster_list` en el canal.
+    Si se indica `end` (timestamp), a esa hora se cierra (ver close_checkin).
+    """
+    # Conductores del roster que están registrados
+    driver_ids = []
+    for name, match in resolve_roster(roster_list):
         if match:
-            mentions.append(f"@{match['username']}")
+            driver_ids.append(str(match["id"]))
 
-    if not mentions:
-        await context.bot.send_message(
+    if not driver_ids:
+        await outbox.notify(
+            "send_message",
+            PRIORITY_CHANNEL,
             chat_id=CHANNEL_ID,
             text="No se detectaron usuarios registrados para el check-in."
         )
         return
 
-    # Mensaje final
-    text = (
-        "<b>¡Check-in abierto!</b>\n\n"
-        "Conductores programados:\n"
-        + "\n".join(mentions)
-        + "\n\nPulsa el botón para confirmar tu asistencia."
-    )
+    # Cada publicación es una sesión con su propia asistencia
+    session = await write_queue.submit(attendance.open_session, driver_ids, None, end)
 
     # Botón de check-in
-    keyboard = [[InlineKeyboardButton("Check-in", callback_data="do_checkin")]]
+    keyboard = [[InlineKeyboardButton("Check-in", callback_data=f"do_checkin:{session.sid}")]]
     markup = InlineKeyboardMarkup(keyboard)
 
-    await context.bot.send_message(
+    # Se publica vía outbox: si Telegram falla se reintenta (también
+    # tras un reinicio) en vez de perder el anuncio
+    await outbox.notify(
+        "send_message",
+        PRIORITY_CHANNEL,
+        on_sent="checkin_posted",
+        hook_data={"sid": session.sid, "end": end},
         chat_id=CHANNEL_ID,
-        text=text,
+        text=render_checkin_text(session),
         parse_mode="HTML",
         reply_markup=markup
     )
 
 
+def _track_checkin_message(message, data):
+    """
+    Hook del outbox cuando el mensaje de check-in ya está publicado:
+    desde aquí se irá editando a medida que los conductores confirman,
+    y si tiene hora de fin se programa su cierre.
+    """
+    session = attendance.sessions.get(data["sid"])
+    if session is None:
+        return
+    attendance.attach(session.sid, message.chat_id, message.message_id)
+    live_messages.track(
+        message.chat_id,
+        message.message_id,
+        render_checkin_text(session),
+        lambda: render_checkin_text(session),
+        parse_mode="HTML",
+        reply_markup=message.reply_markup
+    )
+    if data.get("end"):
+        scheduler.add(
+            "checkin_close",
+            datetime.datetime.fromtimestamp(data["end"]),
+            data={"sid": session.sid, "chat_id": message.chat_id, "message_id": message.message_id},
+            label=f"Cierre del check-in {message.message_id}"
+        )
+
+
+async def close_checkin(context: CallbackContext):
+    """
+    Fin de la ventana de check-in:
+    1) Cierra la sesión: a partir de aquí no se aceptan más check-ins.
+    2) Deja de seguir el mensaje y lo edita con el resultado final (sin botón).
+    """
+    job_data = context.job.data
+    session = attendance.sessions.get(job_data["sid"])
+    if session is None:
+        return
+    await write_queue.submit(attendance.close, session.sid)
+    live_messages.untrack(job_data["chat_id"], job_data["message_id"])
+    try:
+        await send_queue.send(
+            "edit_message_text",
+            PRIORITY_CHANNEL,
+            chat_id=job_data["chat_id"],
+            message_id=job_data["message_id"],
+            text=render_checkin_text(session, closed=True),
+            parse_mode="HTML"
+        )
+    except Exception:
+        logger.exception("No se pudo cerrar el mensaje %s", job_data["message_id"])
+
+outbox.register_hook("checkin_posted", _track_checkin_message)
+scheduler.register("checkin", send_checkin_message)
+scheduler.register("checkin_close", close_checkin)
+
+
+def fit_lines(head, lines, tail="", limit=MAX_MESSAGE_LENGTH):
+    """
+    head + lines + tail sin pasar de `limit` caracteres: las líneas que
+    no entran se resumen en "... y N más".
+    """
+    budget = limit - len(head) - len(tail) - len("\n... y 99999 más")
+    shown = []
+    for line in lines:
+        budget -= len(line) + 1
+        if budget < 0:
+            break
+        shown.append(line)
+    if len(shown) < len(lines):
+        shown.append(f"... y {len(lines) - len(shown)} más")
+    return head + "\n".join(shown) + tail
+
+
+def render_checkin_text(session, closed=False):
+    """
+    Texto del mensaje de check-in: cuántos confirmaron y quiénes faltan.
+    Con rosters grandes la lista se corta para no pasar el límite de
+    Telegram (ver fit_lines); los que ya confirmaron solo se cuentan.
+    """
+    missing = []
+    for uid in session.absent():
+        info = get_user(uid)
+        if info:
+            missing.append(f"@{info['username']} ❌")
+
+    if closed:
+        return fit_lines(
+            "<b>Check-in cerrado</b>\n\n"
+            f"Confirmaron {session.count} de {len(session)}.\n"
+            + ("No confirmaron:\n" if missing else ""),
+            missing
+        )
+    return fit_lines(
+        "<b>¡Check-in abierto!</b>\n\n"
+        f"✅ Confirmaron {session.count} de {len(session)}.\n"
+        + ("Faltan:\n" if missing else ""),
+        missing,
+        "\n\nPulsa el botón para confirmar tu asistencia."
+    )
+
+
 async def cancel_roster_setup(update: Update, context: CallbackContext) -> None:
     """
     Cancela todo el proceso.
@@ -212,36 +387,28 @@ async def cancel_roster_setup(update: Update, context: CallbackContext) -> None:
 
     # Limpiamos variables temporales
     context.user_data.pop("roster_list", None)
-    context.user_data.pop("checkin_datetime", None)
-    context.user_data.pop("waiting_for_date_time", None)
+    context.user_data.pop("start_dt", None)
+    context.user_data.pop("end_dt", None)
+    context.user_data.pop("state", None)
 
     await query.message.edit_text("❌ Proceso cancelado.")
 
 
+# Rutas del flujo de roster (ver dispatcher.py): botones por prefijo y
+# texto libre según el estado del admin
+dispatcher.callback("ask_date_time", ask_date_time)
+dispatcher.callback("confirm_roster_schedule", confirm_roster_schedule)
+dispatcher.callback("cancel_roster_setup", cancel_roster_setup)
+dispatcher.text("roster", start_checkin)
+dispatcher.text("date_time", handle_date_input)
+
+
 def register_checkin_handlers(app):
     """
-    Registra los handlers necesarios.
-    Asegúrate de llamar a register_checkin_handlers(app) en tu main.py.
+    Registra los comandos del check-in.
+    Los botones y el texto del flujo de roster van por el dispatcher.
     """
 
-    # Nota: si ya tienes un CommandHandler("roster", ...) en otra parte,
-    # haz que llame a 'start_checkin' al recibir la lista.
-    # O bien puedes usar ConversationHandler; esto es un ejemplo simplificado.
-
-    # CallbackQueries
-    app.add_handler(CallbackQueryHandler(ask_date_time, pattern="^ask_date_time$"))
-    app.add_handler(CallbackQueryHandler(confirm_roster_schedule, pattern="^confirm_roster_schedule$"))
-    app.add_handler(CallbackQueryHandler(cancel_roster_setup, pattern="^cancel_roster_setup$"))
-
-    # El check-in final (cuando el conductor pulsa el botón "Check-in")
-    # se maneja con un CallbackQueryHandler en main.py o aquí, como prefieras.
-    # Podrías hacer algo como:
-    # app.add_handler(CallbackQueryHandler(checkin_button_callback, pattern="^do_checkin$"))
-
-    # Manejo del input de fecha/hora (texto).
-    # Necesitas un MessageHandler que capture el texto mientras se espera la fecha.
-    # Ejemplo:
-    # from telegram.ext import MessageHandler, filters
-    # app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_date_input))
-
-    # OJO: Asegúrate de que no choque con otros MessageHandlers que tengas para /start u otros.
+    # Check-ins programados
+    app.add_handler(CommandHandler("programados", list_scheduled))
+    app.add_handler(CommandHandler("cancelar", cancel_scheduled))
@@ -3,8 +3,50 @@
 # Token del bot
 BOT_TOKEN = '8059228554:AAFa2m9b5pNymL8c6hoXg7vAIkurgNGJ_5g'
 
+# Bot API al que se conecta el bot (vacío = api.telegram.org). Sirve
+# para un Bot API propio o el falso de benchmarks/fake_bot_api.py,
+# p.ej. 'http://127.0.0.1:8081/bot'
+BOT_API_URL = ''
+
 # ID del administrador
 ADMIN_ID = 366928657
 
 # ID del canal
 CHANNEL_ID = -1002253871334
+
+# Almacenamiento de usuarios: "json" (users_db.json, para instalaciones
+# pequeñas) o "sqlite". Para pasar a SQLite: python sqlite_store.py
+DB_BACKEND = "json"
+DB_FILE = 'users_db.json'
+SQLITE_FILE = 'users.db'
+
+# Modo webhook: si WEBHOOK_URL está vacío se usa run_polling().
+# Telegram enviará los updates a WEBHOOK_URL + "/" + WEBHOOK_PATH;
+# el bot escucha en WEBHOOK_LISTEN:WEBHOOK_PORT (p.ej. detrás de nginx).
+WEBHOOK_URL = ''              # p.ej. 'https://bot.example.com'
+WEBHOOK_LISTEN = '0.0.0.0'
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = 'telegram'
+# Telegram lo manda en la cabecera X-Telegram-Bot-Api-Secret-Token y se
+# rechaza cualquier petición que no lo traiga (1-256 caracteres A-Z a-z 0-9 _ -).
+# Obligatorio en modo webhook: sin él el bot no arranca.
+WEBHOOK_SECRET = ''
+# Conexiones simultáneas que Telegram abre hacia el webhook (1-100)
+WEBHOOK_MAX_CONNECTIONS = 40
+
+# Updates que se procesan a la vez (de usuarios distintos; los de un
+# mismo usuario siempre van en orden, ver update_processor.py)
+UPDATE_CONCURRENCY = 64
+
+# Grabación de updates para reproducirlos con benchmarks/replay.py.
+# Vacío = no se graba. Admite formato strftime (un archivo por día),
+# p.ej. 'recordings/updates-%Y-%m-%d.jsonl.gz'
+RECORD_UPDATES = ''
+# Con una clave, ids y nombres se graban seudonimizados (la misma clave
+# se le pasa a replay.py para adaptar la copia de la BD)
+RECORD_ANONYMIZE_KEY = ''
+
+# Métricas en formato Prometheus en http://METRICS_LISTEN:METRICS_PORT/metrics
+# (0 = desactivado)
+METRICS_PORT = 0
+METRICS_LISTEN = '127.0.0.1'
@@ -1,77 +1,183 @@
-import json
-import os
+from config import DB_BACKEND, DB_FILE, SQLITE_FILE
+from json_store import UserStore
+from sqlite_store import SqliteStore
+from name_index import NameIndex, SortedUsers
+from metrics import db_op
 
-DB_FILE = 'users_db.json'
+# El backend se elige en config.DB_BACKEND. Ambos exponen la misma
+# interfaz (section/get/put/delete/update/load/save).
+if DB_BACKEND == "sqlite":
+    _store = SqliteStore(SQLITE_FILE)
+else:
+    _store = UserStore(DB_FILE)
+
+# Índices en memoria (nombre -> conductor y listas ordenadas para
+# paginar); se reconstruyen si la BD cambia por fuera
+_name_index = NameIndex()
+_sorted = {"approved": SortedUsers(), "pending": SortedUsers()}
+_index_generation = None
 
 def initialize_database():
-    if not os.path.exists(DB_FILE):
-        with open(DB_FILE, 'w') as file:
-            json.dump({"approved": {}, "pending": {}}, file, indent=4)
-    else:
-        with open(DB_FILE, 'r') as file:
-            try:
-                data = json.load(file)
-                if "approved" not in data:
-                    data["approved"] = {}
-                if "pending" not in data:
-                    data["pending"] = {}
-                with open(DB_FILE, 'w') as file_w:
-                    json.dump(data, file_w, indent=4)
-            except json.JSONDecodeError:
-                with open(DB_FILE, 'w') as file_w:
-                    json.dump({"approved": {}, "pending": {}}, file_w, indent=4)
+    _store.open()
+
+def _refresh_indexes():
+    global _index_generation
+    generation = _store.generation
+    if generation != _index_generation:
+        approved = _store.section("approved")
+        _name_index.build(approved)
+        _sorted["approved"].build(approved)
+        _sorted["pending"].build(_store.section("pending"))
+        _index_generation = generation
+
+def _names():
+    _refresh_indexes()
+    return _name_index
+
+def _index_put(section, user_id, info):
+    _refresh_indexes()
+    if section == "approved":
+        _name_index.add(user_id, info)
+    _sorted[section].add(user_id, info)
+
+def _index_remove(section, user_id):
+    _refresh_indexes()
+    if section == "approved":
+        _name_index.remove(user_id)
+    _sorted[section].remove(user_id)
 
 initialize_database()
 
+# Agrupa varios cambios (una transacción / un solo fsync). Lo usa
+# write_queue.py; después de batch() hay que llamar a sync().
+def batch():
+    return _store.batch()
+
+# Fuerza a disco los cambios hechos hasta ahora (bloqueante).
+def sync():
+    _store.sync()
+
+# Devuelve la BD completa. Con el backend JSON es el objeto cacheado
+# (compartido por todos los handlers); si se modifica hay que llamar
+# a save_database(). Con SQLite se arma desde las tablas en cada llamada.
+@db_op("read", measure=True)
 def load_users():
-    with open(DB_FILE, 'r') as file:
-        return json.load(file)
+    return _store.load()
 
+# Reemplaza la BD completa. Para cambios de un solo usuario usa las
+# funciones de abajo, que solo tocan ese registro.
+@db_op("write", measure=True)
 def save_database(data):
-    with open(DB_FILE, 'w') as file:
-        json.dump(data, file, indent=4)
+    _store.save(data)
 
+@db_op("write")
 def add_user(user_id, name, username):
-    db = load_users()
-    if "approved" not in db:
-        db["approved"] = {}
     # Se añade "checked_in": False para el nuevo usuario aprobado
-    db["approved"][str(user_id)] = {
+    info = {
         "name": name,
         "username": username,
         "id": user_id,
         "checked_in": False
     }
-    save_database(db)
+    _store.put("approved", user_id, info)
+    _index_put("approved", user_id, info)
 
+@db_op("write")
 def add_pending_user(user_id, name, username):
-    db = load_users()
-    if "pending" not in db:
-        db["pending"] = {}
-    db["pending"][str(user_id)] = {"name": name, "username": username, "id": user_id}
-    save_database(db)
+    info = {"name": name, "username": username, "id": user_id}
+    _store.put("pending", user_id, info)
+    _index_put("pending", user_id, info)
+
+# Mueve un usuario de "pending" a "approved". Devuelve sus datos o None.
+@db_op("write")
+def approve_pending_user(user_id):
+    info = _store.get("pending", user_id)
+    if info is None:
+        return None
+    info = dict(info, checked_in=False)
+    _store.put("approved", user_id, info)
+    _store.delete("pending", user_id)
+    _index_remove("pending", user_id)
+    _index_put("approved", user_id, info)
+    return info
+
+# Elimina una solicitud pendiente. Devuelve sus datos o None.
+@db_op("write")
+def deny_pending_user(user_id):
+    info = _store.get("pending", user_id)
+    if info is not None:
+        _store.delete("pending", user_id)
+        _index_remove("pending", user_id)
+    return info
 
+# Elimina un usuario aprobado. Devuelve sus datos o None.
+@db_op("write")
 def remove_user(user_id):
-    db = load_users()
-    if "approved" in db and str(user_id) in db["approved"]:
-        del db["approved"][str(user_id)]
-    save_database(db)
+    info = _store.get("approved", user_id)
+    if info is not None:
+        _store.delete("approved", user_id)
+        _index_remove("approved", user_id)
+    return info
+
+@db_op("write")
+def rename_user(user_id, name):
+    if user_exists(user_id):
+        _store.update("approved", user_id, {"name": name})
+        _index_put("approved", user_id, _store.get("approved", user_id))
+        return True
+    return False
+
+@db_op("read")
+def get_user(user_id):
+    return _store.get("approved", user_id)
+
+# Resuelve un roster: lista de (nombre, datos del conductor o None).
+# Los nombres se comparan sin importar mayúsculas, tildes ni espacios de más.
+@db_op("read")
+def resolve_roster(names):
+    index = _names()
+    return [(name, index.lookup(name)) for name in names]
+
+# Sugerencias para un nombre que no está registrado (typos)
+@db_op("read")
+def suggest_users(name, limit=3):
+    return _names().suggest(name, limit)
+
+# Página de usuarios ordenados por nombre para las listas del admin.
+# Devuelve (usuarios, hay_anterior, hay_siguiente); ver SortedUsers.page.
+@db_op("read")
+def get_users_page(cursor=None, backwards=False, size=10):
+    _refresh_indexes()
+    return _sorted["approved"].page(cursor, backwards, size)
+
+@db_op("read")
+def get_pending_page(cursor=None, backwards=False, size=10):
+    _refresh_indexes()
+    return _sorted["pending"].page(cursor, backwards, size)
+
+@db_op("read")
+def count_users():
+    _refresh_indexes()
+    return len(_sorted["approved"])
+
+@db_op("read")
+def get_pending_user(user_id):
+    return _store.get("pending", user_id)
 
+@db_op("read")
 def get_all_users():
-    db = load_users()
-    return db.get("approved", {})
+    return _store.section("approved")
 
+@db_op("read")
 def get_pending_users():
-    db = load_users()
-    return db.get("pending", {})
+    return _store.section("pending")
 
+@db_op("read")
 def user_exists(user_id):
-    db = load_users()
-    return str(user_id) in db.get("approved", {})
+    return _store.get("approved", user_id) is not None
 
 # Función para marcar check-in (true/false) de un usuario en "approved"
+@db_op("write")
 def set_check_in(user_id, status=True):
-    db = load_users()
-    if str(user_id) in db["approved"]:
-        db["approved"][str(user_id)]["checked_in"] = status
-        save_database(db)
+    if user_exists(user_id):
+        _store.update("approved", user_id, {"checked_in": status})
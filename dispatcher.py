@@ -0,0 +1,63 @@
+# dispatcher.py
+
+import logging
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes, MessageHandler, filters
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    """
+    Un solo punto de entrada para botones y texto libre.
+    - Botones: callback_data = "<prefijo>" o "<prefijo>:<argumento>".
+      El prefijo se busca en un dict, así cada tap se enruta con una
+      sola búsqueda en vez de probar regex uno por uno.
+    - Texto: se enruta según context.user_data["state"] (qué está
+      esperando el bot de ese usuario: "roster", "date_time", ...).
+      El estado se consume al entregar el mensaje; si el handler
+      necesita otro intento lo vuelve a poner.
+    - Cada módulo registra sus rutas con callback() y text(), igual que
+      los hooks del outbox o los tipos del scheduler.
+    - Cada ruta se mide por separado (metrics.timed), con el nombre de
+      su handler.
+    """
+
+    def __init__(self):
+        self._callbacks = {}  # prefijo -> handler
+        self._texts = {}      # estado -> handler
+
+    def callback(self, prefix, handler):
+        if prefix in self._callbacks:
+            raise ValueError(f"Prefijo de callback duplicado: {prefix}")
+        self._callbacks[prefix] = timed(handler)
+
+    def text(self, state, handler):
+        self._texts[state] = timed(handler)
+
+    async def dispatch_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        handler = self._callbacks.get(query.data.partition(":")[0])
+        if handler is None:
+            # Botón de una versión vieja del bot o desconocido
+            logger.warning("Callback sin ruta: %s", query.data)
+            await query.answer()
+            return
+        await handler(update, context)
+
+    async def dispatch_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        state = context.user_data.pop("state", None)
+        handler = self._texts.get(state)
+        if handler is None:
+            return  # No se esperaba texto de este usuario
+        await handler(update, context)
+
+    def register(self, app):
+        app.add_handler(CallbackQueryHandler(self.dispatch_callback))
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.dispatch_text))
+
+
+dispatcher = Dispatcher()
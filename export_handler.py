@@ -0,0 +1,138 @@
+# export_handler.py
+
+import asyncio
+import csv
+import datetime
+import gzip
+import itertools
+import json
+import os
+import tempfile
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from config import ADMIN_ID
+from attendance import attendance
+from database import get_all_users
+from send_queue import send_queue, PRIORITY_ADMIN
+
+# Filas por escritura al archivo temporal
+EXPORT_CHUNK = 5000
+# Formatos aceptados por /exportar (los .gz van comprimidos)
+EXPORT_FORMATS = ("csv", "jsonl", "csv.gz", "jsonl.gz")
+# Límite de Telegram para documentos enviados por bots
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+COLUMNS = ["session", "window_start", "window_end", "driver_id", "name", "username",
+           "checked_in", "checked_in_at", "minutes_from_open"]
+
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else ""
+
+
+def export_records(rows, names):
+    """Convierte las filas de attendance.export_rows() en dicts con las COLUMNS."""
+    window_sid = None
+    for sid, start, end, uid, present, checked_at in rows:
+        if sid != window_sid:
+            # Las filas de una sesión vienen juntas: la ventana se formatea una vez
+            window_sid, window = sid, (_iso(start), _iso(end))
+        name, username = names.get(uid, ("", ""))
+        yield {
+            "session": sid,
+            "window_start": window[0],
+            "window_end": window[1],
+            "driver_id": uid,
+            "name": name,
+            "username": username,
+            "checked_in": int(present),
+            "checked_in_at": _iso(checked_at),
+            "minutes_from_open": round((checked_at - start) / 60, 1) if present else "",
+        }
+
+
+def write_export(records, fmt):
+    """
+    Escribe `records` en un archivo temporal, de EXPORT_CHUNK en
+    EXPORT_CHUNK filas, y devuelve (ruta, filas). Se llama en un hilo.
+    """
+    fd, path = tempfile.mkstemp(prefix="asistencia_", suffix="." + fmt)
+    os.close(fd)
+    opener = gzip.open if fmt.endswith(".gz") else open
+    total = 0
+    try:
+        with opener(path, "wt", encoding="utf-8", newline="") as file:
+            writer = None
+            if fmt.startswith("csv"):
+                writer = csv.DictWriter(file, fieldnames=COLUMNS)
+                writer.writeheader()
+            while True:
+                chunk = list(itertools.islice(records, EXPORT_CHUNK))
+                if not chunk:
+                    break
+                if writer:
+                    writer.writerows(chunk)
+                else:
+                    file.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in chunk))
+                total += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, total
+
+
+# /exportar <desde> <hasta> [formato] — asistencia por conductor (solo admin)
+async def export_attendance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    args = context.args or []
+    fmt = args[2].lower() if len(args) > 2 else "csv"
+    try:
+        if len(args) < 2 or fmt not in EXPORT_FORMATS:
+            raise ValueError("Faltan datos")
+        since = datetime.datetime.strptime(args[0], "%Y-%m-%d")
+        until = datetime.datetime.strptime(args[1], "%Y-%m-%d") + datetime.timedelta(days=1)
+        if since >= until:
+            raise ValueError("Rango vacío")
+    except ValueError:
+        await update.message.reply_text(
+            "Uso: /exportar YYYY-MM-DD YYYY-MM-DD [csv|jsonl|csv.gz|jsonl.gz]\n\n"
+            "Ejemplo: /exportar 2025-01-01 2025-01-31 csv"
+        )
+        return
+
+    # Los nombres se toman aquí (en el hilo del bot); el historial se lee
+    # y se escribe en un hilo aparte, fila a fila
+    names = {uid: (info["name"], info["username"]) for uid, info in get_all_users().items()}
+    records = export_records(attendance.export_rows(since.timestamp(), until.timestamp()), names)
+    path, total = await asyncio.to_thread(write_export, records, fmt)
+    try:
+        if not total:
+            await update.message.reply_text("No hay asistencia registrada en ese rango.")
+            return
+        if os.path.getsize(path) > MAX_DOCUMENT_SIZE:
+            await update.message.reply_text(
+                "El archivo supera el límite de Telegram (50 MB). "
+                "Usa un rango más corto o un formato .gz."
+            )
+            return
+        with open(path, "rb") as file:
+            await send_queue.send(
+                "send_document",
+                PRIORITY_ADMIN,
+                chat_id=update.effective_chat.id,
+                document=file,
+                filename=f"asistencia_{args[0]}_{args[1]}.{fmt}",
+                caption=f"{total} filas",
+                read_timeout=120,
+                write_timeout=120
+            )
+    finally:
+        os.remove(path)
+
+
+def register_export_handlers(app):
+    app.add_handler(CommandHandler("exportar", export_attendance))
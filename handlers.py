@@ -1,6 +1,16 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
-from database import get_all_users, load_users, save_database
+from database import (
+	get_pending_user,
+	get_user,
+	get_users_page,
+	get_pending_page,
+	count_users
+)
+import database
+from send_queue import send_queue, PRIORITY_ADMIN
+from outbox import outbox
+from dispatcher import dispatcher
 from config import ADMIN_ID
 import datetime
 import telegram
@@ -18,21 +28,13 @@ def get_main_menu():
 async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id != ADMIN_ID:  # Si no es admin
-        # Guardar al usuario en pendientes
-        db = get_all_users()
-
-        # Asegurar que 'pending' existe
-        if 'pending' not in db:
-            db['pending'] = {}  # Crear clave si no existe
-
-        # Añadir usuario a 'pending' si no está ya registrado
-        if str(user_id) not in db['pending']:
-            db['pending'][str(user_id)] = {
-                "name": update.effective_user.full_name,
-                "username": update.effective_user.username,
-                "id": user_id
-            }
-            save_database(db)
+        # Guardar al usuario en pendientes (si no está ya registrado)
+        if not get_pending_user(user_id):
+            database.add_pending_user(
+                user_id,
+                update.effective_user.full_name,
+                update.effective_user.username
+            )
 
         # Notificar solicitud enviada
         await update.message.reply_text(
@@ -67,11 +69,36 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
+# PAGINACIÓN DE LISTAS
+# Las listas del admin se muestran por páginas de PAGE_SIZE usuarios,
+# ordenadas por nombre. Los botones llevan el cursor en el callback:
+# "<lista>:<n|p>:<user_id del borde de la página actual>"
+PAGE_SIZE = 10
+
+def _load_page(get_page, data):
+	cursor, backwards = None, False
+	if ":" in data:
+		_, direction, cursor = data.split(":", 2)
+		backwards = direction == "p"
+	users, has_prev, has_next = get_page(cursor, backwards, PAGE_SIZE)
+	if not users and cursor:
+		# El cursor quedó al final (se borraron usuarios): primera página
+		users, has_prev, has_next = get_page(None, False, PAGE_SIZE)
+	return users, has_prev, has_next
+
+def _page_buttons(name, users, has_prev, has_next):
+	row = []
+	if has_prev:
+		row.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"{name}:p:{users[0][0]}"))
+	if has_next:
+		row.append(InlineKeyboardButton("Next ➡️", callback_data=f"{name}:n:{users[-1][0]}"))
+	return [row] if row else []
+
+
 # LISTAR USUARIOS APROBADOS
 async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
-	# Cargar la base de datos completa
-	db = load_users()
-	users = db.get('approved', {})  # Obtener solo los usuarios aprobados
+	# Página actual de usuarios aprobados
+	users, has_prev, has_next = _load_page(get_users_page, update.callback_query.data)
 
 	# Verificar si no hay usuarios aprobados
 	if not users:
@@ -80,12 +107,13 @@ async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
 		# Crear lista de usuarios aprobados
 		user_list = "\n".join([
 			f"{u['name']} (@{u['username']}) - ID: {uid}"
-			for uid, u in users.items()
+			for uid, u in users
 		])
-		message = f"✅ Approved Users:\n\n{user_list}"
+		message = f"✅ Approved Users ({count_users()}):\n\n{user_list}"
 
-	# Botón para regresar
-	keyboard = [[InlineKeyboardButton("⬅️ Back", callback_data='back')]]
+	# Botones de página y para regresar
+	keyboard = _page_buttons("list_users", users, has_prev, has_next)
+	keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data='back')])
 	reply_markup = InlineKeyboardMarkup(keyboard)
 
 	# Mostrar la lista o el mensaje
@@ -95,9 +123,8 @@ async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # SOLICITUDES PENDIENTES
 async def pending_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
-	# Cargar la base de datos completa
-	db = load_users()
-	users = db.get('pending', {})  # Obtener solo los pendientes como diccionario
+	# Página actual de solicitudes pendientes
+	users, has_prev, has_next = _load_page(get_pending_page, update.callback_query.data)
 
 	# Verificar si no hay solicitudes pendientes
 	if not users:
@@ -109,13 +136,14 @@ async def pending_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 	# Construir el teclado dinámico con usuarios pendientes
 	keyboard = []
-	for uid, u in users.items():
+	for uid, u in users:
 		keyboard.append([
-			InlineKeyboardButton(f"{u['name']} (@{u['username']})", callback_data=f"approve_{uid}"),
-			InlineKeyboardButton("❌ Deny", callback_data=f"deny_{uid}")
+			InlineKeyboardButton(f"{u['name']} (@{u['username']})", callback_data=f"approve:{uid}"),
+			InlineKeyboardButton("❌ Deny", callback_data=f"deny:{uid}")
 		])
 
-	# Añadir botón para regresar al menú principal
+	# Añadir botones de página y para regresar al menú principal
+	keyboard.extend(_page_buttons("pending_requests", users, has_prev, has_next))
 	keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data='back')])
 
 	# Mostrar lista de solicitudes pendientes
@@ -123,70 +151,52 @@ async def pending_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	await update.callback_query.message.edit_text("👥 Pending Requests:", reply_markup=reply_markup)
 
 
+# Edita el mensaje del admin pasando por la cola de envío con
+# prioridad alta (sale antes que los DMs masivos)
+async def _reply_admin(query, text):
+	await send_queue.send(
+		"edit_message_text",
+		PRIORITY_ADMIN,
+		chat_id=query.message.chat_id,
+		message_id=query.message.message_id,
+		text=text
+	)
+
+
 # APROBAR USUARIO
 async def approve_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
-	user_id = query.data.split("_")[-1]  # Obtener ID del usuario
-
-	# Cargar base de datos
-	db = load_users()
-	pending_users = db.get('pending', {})
-	approved_users = db.get('approved', {})
+	user_id = query.data.partition(":")[2]  # Obtener ID del usuario
 
-	if user_id in pending_users:
-		# Mover a la lista de aprobados
-		approved_users[user_id] = pending_users.pop(user_id)
-		db['approved'] = approved_users
-		db['pending'] = pending_users
-		save_database(db)
+	# Mover a la lista de aprobados
+	user_info = database.approve_pending_user(user_id)
 
+	if user_info:
 		# Notificar al usuario aprobado
-		try:
-			await context.bot.send_message(
-				chat_id=user_id,
-				text="✅ You have been approved!"
-			)
-		except Exception:
-			pass  # El usuario pudo haber bloqueado el bot
+		# (se guarda en el outbox y se reintenta si falla)
+		await outbox.notify("send_message", chat_id=user_id, text="✅ You have been approved!")
 
 		# Confirmar al admin
-		await query.edit_message_text(
-			text=f"User {approved_users[user_id]['name']} has been approved."
-		)
+		await _reply_admin(query, f"User {user_info['name']} has been approved.")
 	else:
-		await query.edit_message_text(text="User not found or already approved.")
+		await _reply_admin(query, "User not found or already approved.")
 
 
 # DENEGAR USUARIO
 async def deny_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
-	user_id = query.data.split("_")[-1]  # Obtener ID del usuario
-
-	# Cargar base de datos
-	db = load_users()
-	pending_users = db.get('pending', {})
-
-	if user_id in pending_users:
-		# Eliminar de la lista de pendientes
-		pending_users.pop(user_id)
-		db['pending'] = pending_users
-		save_database(db)
+	user_id = query.data.partition(":")[2]  # Obtener ID del usuario
 
+	# Eliminar de la lista de pendientes
+	if database.deny_pending_user(user_id):
 		# Notificar al usuario denegado
-		try:
-			await context.bot.send_message(
-				chat_id=user_id,
-				text="❌ Your request has been denied."
-			)
-		except Exception:
-			pass  # El usuario pudo haber bloqueado el bot
+		# (se guarda en el outbox y se reintenta si falla)
+		await outbox.notify("send_message", chat_id=user_id, text="❌ Your request has been denied.")
 
 		# Confirmar al admin
-		await query.edit_message_text(
-			text=f"User {user_id} has been denied."
-		)
+		await _reply_admin(query, f"User {user_id} has been denied.")
 	else:
-		await query.edit_message_text(text="User not found or already denied.")
+		await _reply_admin(query, "User not found or already denied.")
 
 
 
@@ -195,9 +205,8 @@ async def deny_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def remove_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
 
-	# Obtener la lista de usuarios aprobados
-	db = load_users()
-	users = db.get('approved', {})  # Revisar la sección 'approved'
+	# Página actual de usuarios aprobados
+	users, has_prev, has_next = _load_page(get_users_page, query.data)
 
 	# Verificar si hay usuarios aprobados
 	if not users:
@@ -206,9 +215,10 @@ async def remove_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 	# Crear botones para seleccionar usuario a eliminar
 	keyboard = [
-		[InlineKeyboardButton(f"{u['name']} – ID: {uid}", callback_data=f"remove_{uid}")]
-		for uid, u in users.items()
+		[InlineKeyboardButton(f"{u['name']} – ID: {uid}", callback_data=f"remove:{uid}")]
+		for uid, u in users
 	]
+	keyboard.extend(_page_buttons("remove_user", users, has_prev, has_next))
 	keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data='back')])
 
 	# Mostrar menú
@@ -220,33 +230,20 @@ async def remove_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # CONFIRMAR ELIMINACIÓN DE USUARIO
 async def confirm_remove_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
-	user_id = query.data.split("_")[-1]  # Obtener ID del usuario
-
-	# Obtener la lista de usuarios aprobados
-	db = load_users()
-	users = db.get('approved', {})
+	user_id = query.data.partition(":")[2]  # Obtener ID del usuario
 
-	if user_id in users:
-		# Eliminar al usuario
-		user_info = users.pop(user_id)
-		db['approved'] = users  # Actualizar la base de datos
-		save_database(db)
+	# Eliminar al usuario
+	user_info = database.remove_user(user_id)
 
+	if user_info:
 		# Notificar al usuario eliminado
-		try:
-			await context.bot.send_message(
-				chat_id=user_id,
-				text="❌ You have been removed from the system."
-			)
-		except Exception:
-			pass  # El usuario podría haber bloqueado el bot
+		# (se guarda en el outbox y se reintenta si falla)
+		await outbox.notify("send_message", chat_id=user_id, text="❌ You have been removed from the system.")
 
 		# Confirmar al administrador
-		await query.edit_message_text(
-			text=f"User {user_info['name']} (@{user_info['username']}) has been removed."
-		)
+		await _reply_admin(query, f"User {user_info['name']} (@{user_info['username']}) has been removed.")
 	else:
-		await query.edit_message_text(text="User not found or already removed.")
+		await _reply_admin(query, "User not found or already removed.")
 
 
 
@@ -254,18 +251,10 @@ async def confirm_remove_user(update: Update, context: ContextTypes.DEFAULT_TYPE
 # ELIMINAR DEFINITIVO
 async def delete_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
-	user_id = query.data.split('_')[1]  # Obtener ID del usuario
-
-	# Cargar base de datos
-	db = load_users()
-	approved_users = db.get('approved', {})
-
-	# Verificar si el usuario existe
-	if user_id in approved_users:
-		del approved_users[user_id]  # Eliminar usuario
-		db['approved'] = approved_users
-		save_database(db)
+	user_id = query.data.partition(":")[2]  # Obtener ID del usuario
 
+	# Eliminar usuario (si existe)
+	if database.remove_user(user_id):
 		# Confirmar eliminación
 		await query.message.edit_text(f"User with ID {user_id} removed successfully.")
 	else:
@@ -284,12 +273,19 @@ async def refresh_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # Refrescar datos (simula obtener datos actualizados)
-    db = load_users()
-    users = db.get('approved', {})
-    total_users = len(users)
+    total_users = count_users()
+
+    # Estado de la cola de envío y del outbox
+    queue = send_queue.stats()
+    pending = outbox.stats()
 
     # Mensaje actualizado
-    message = f"✅ Last Updated: {now}\n👥 Total Users: {total_users}"
+    message = (
+        f"✅ Last Updated: {now}\n👥 Total Users: {total_users}\n"
+        f"📤 Send queue: {queue['depth']} queued, {queue['dropped']} dropped, "
+        f"{queue['failed']} failed\n"
+        f"📬 Outbox: {pending['pending']} pending, {pending['dead']} dead-lettered"
+    )
 
     # Actualizar solo los datos sin cambiar el menú
     await query.edit_message_text(message)
@@ -306,9 +302,8 @@ async def edit_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
 	await query.answer()
 
-	# Cargar base de datos
-	db = load_users()
-	users = db.get('approved', {})
+	# Página actual de usuarios aprobados
+	users, has_prev, has_next = _load_page(get_users_page, query.data)
 
 	# Verifica si hay usuarios cargados
 	if not users:
@@ -317,17 +312,18 @@ async def edit_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 	# Crear botones para los usuarios aprobados
 	keyboard = []
-	for uid, u in users.items():
+	for uid, u in users:
 		# Verificar claves necesarias
 		if 'name' in u and 'id' in u:
 			keyboard.append([
 				InlineKeyboardButton(
 					f"{u['name']} – ID: {uid}",
-					callback_data=f"edit_{uid}"
+					callback_data=f"edit:{uid}"
 				)
 			])
 
-	# Botón para regresar
+	# Botones de página y para regresar
+	keyboard.extend(_page_buttons("edit_user", users, has_prev, has_next))
 	keyboard.append([InlineKeyboardButton("⬅️ Back", callback_data='back')])
 
 	# Responder con el menú
@@ -349,21 +345,19 @@ async def request_new_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	query = update.callback_query
 	await query.answer()
 
-	# Obtener ID del usuario desde el callback_data
-	user_id = query.data.split("_")[1]
-
-	# Cargar base de datos
-	db = load_users()
-	users = db.get('approved', {})
+	# Obtener ID del usuario desde el callback_data ("edit:<id>")
+	user_id = query.data.partition(":")[2]
 
 	# Verificar si el usuario existe
-	if user_id in users:
-		# Guardar ID en contexto
+	user_info = get_user(user_id)
+	if user_info:
+		# Guardar ID en contexto; el próximo texto es el nombre nuevo
 		context.user_data['edit_user_id'] = user_id
+		context.user_data['state'] = "edit_name"
 
 		# Solicitar nuevo nombre
 		await query.message.edit_text(
-			f"Enter a new name for {users[user_id]['name']}:"
+			f"Enter a new name for {user_info['name']}:"
 		)
 	else:
 		# Usuario no encontrado
@@ -373,17 +367,10 @@ async def request_new_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # GUARDAR NUEVO NOMBRE
 async def save_new_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 	# Verificar si existe el ID en contexto
-	user_id = context.user_data.get('edit_user_id')
+	user_id = context.user_data.pop('edit_user_id', None)
 	if user_id:
-		# Cargar base de datos
-		db = get_all_users()
-		approved_users = db.get('approved', {})
-
 		# Confirmar ID y actualizar nombre
-		if user_id in approved_users:
-			approved_users[user_id]['name'] = update.message.text
-			save_database(db)
-
+		if database.rename_user(user_id, update.message.text):
 			# Confirmar el cambio
 			await update.message.reply_text(
 				f"User name updated successfully to: {update.message.text}!"
@@ -404,7 +391,8 @@ async def save_new_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Callback para el botón de Roster
 async def roster_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
-    context.user_data["waiting_for_roster"] = True
+    # El siguiente mensaje de texto es la lista (ver start_checkin)
+    context.user_data["state"] = "roster"
     await update.callback_query.message.edit_text(
         "Por favor, envíame la lista de nombres (Nombre y Apellido) en líneas separadas.\n\n"
         "*Ejemplo:*\n"
@@ -413,6 +401,21 @@ async def roster_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "_Nota: Asegúrate de escribirlos correctamente para que puedan ser asignados._",
         parse_mode="Markdown"
     )
-    # Activamos una bandera para que el siguiente mensaje de texto
-    # se maneje en la nueva lógica (start_checkin).
-    context.user_data["waiting_for_roster"] = True
+
+
+# RUTAS DEL MENÚ ADMIN
+# Las listas paginadas usan el mismo prefijo para su primera página
+# ("list_users") y para las siguientes ("list_users:n:<id>").
+dispatcher.callback("list_users", list_users)
+dispatcher.callback("pending_requests", pending_requests)
+dispatcher.callback("remove_user", remove_user)
+dispatcher.callback("edit_user", edit_user)
+dispatcher.callback("approve", approve_user)
+dispatcher.callback("deny", deny_user)
+dispatcher.callback("remove", confirm_remove_user)
+dispatcher.callback("delete", delete_user)
+dispatcher.callback("edit", request_new_name)
+dispatcher.callback("refresh", refresh_menu)
+dispatcher.callback("back", back_to_menu)
+dispatcher.callback("roster", roster_menu)
+dispatcher.text("edit_name", save_new_name)
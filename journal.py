@@ -0,0 +1,166 @@
+# journal.py
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from metrics import bytes_written
+
+
+class Journal:
+    """
+    Archivo append-only con un registro JSON por línea.
+    - append() escribe y hace flush al SO en cada registro.
+    - El fsync se agrupa: cada `sync_every` registros o cuando alguien
+      llama a sync() (p.ej. el hilo de fondo de json_store.py).
+    - Dentro de defer() no se hace fsync automático: quien agrupa
+      escrituras (write_queue.py) llama a sync() una vez al final.
+    - Si el proceso muere a mitad de una línea, esa línea se descarta
+      al abrir el archivo.
+    """
+
+    def __init__(self, path, sync_every=64):
+        self.path = path
+        self.sync_every = sync_every
+        self.count = 0  # Registros en el archivo actual
+        self._unsynced = 0
+        self._deferred = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._name = os.path.basename(path)  # etiqueta para las métricas
+
+    @staticmethod
+    def read(path):
+        """
+        Generador con los registros válidos de `path`.
+        Se detiene en la primera línea incompleta o corrupta.
+        """
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return
+        with file:
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+    def open(self):
+        """
+        Abre el journal para escribir y devuelve los registros existentes.
+        Recorta cualquier cola corrupta para que el siguiente append
+        no quede pegado a una línea a medias.
+        """
+        records, valid_end = [], 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+                    valid_end += len(line)
+            if valid_end != os.path.getsize(self.path):
+                with open(self.path, 'r+b') as file:
+                    file.truncate(valid_end)
+        self._file = open(self.path, 'ab')
+        self.count = len(records)
+        self._unsynced = 0
+        return records
+
+    def append(self, record):
+        """Añade un registro y devuelve los bytes escritos."""
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every and not self._deferred:
+                self._sync_locked()
+        bytes_written.inc(len(line), self._name)
+        return len(line)
+
+    @contextmanager
+    def defer(self):
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferred -= 1
+
+    def sync(self):
+        # El fsync se hace fuera del lock (sobre un dup del descriptor)
+        # para no frenar a quien esté haciendo append mientras tanto.
+        with self._lock:
+            pending = self._unsynced
+            if not pending:
+                return
+            fd = os.dup(self._file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        with self._lock:
+            self._unsynced = max(0, self._unsynced - pending)
+
+    def _sync_locked(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def rotate(self, old_path):
+        """
+        Mueve el journal actual a `old_path` y empieza uno vacío.
+        Se usa al compactar: lo rotado se borra cuando el snapshot
+        nuevo ya está en disco.
+        """
+        with self._lock:
+            if self._unsynced:
+                self._sync_locked()
+            self._file.close()
+            os.replace(self.path, old_path)
+            self._file = open(self.path, 'ab')
+            self.count = 0
+
+    def rewrite(self, records):
+        """
+        Reemplaza el journal por `records` (temporal + rename), p.ej.
+        para quedarse solo con lo que sigue vigente.
+        """
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as file:
+            for record in records:
+                file.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+            file.flush()
+            bytes_written.inc(file.tell(), self._name)
+            os.fsync(file.fileno())
+        with self._lock:
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, 'ab')
+            self.count = len(records)
+            self._unsynced = 0
+
+    def truncate(self):
+        """Vacía el journal (el snapshot ya contiene todo)."""
+        with self._lock:
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            self.count = 0
+            self._unsynced = 0
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                if self._unsynced:
+                    self._sync_locked()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,268 @@
+# json_store.py
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from journal import Journal
+from metrics import bytes_written
+
+# Cada cuántos registros del journal se compacta en un snapshot nuevo
+COMPACT_EVERY = 1000
+# Cada cuántos segundos el hilo de fondo hace fsync del journal
+SYNC_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_db():
+    return {"approved": {}, "pending": {}}
+
+def _read_snapshot(path, quarantine=False):
+    """
+    Lee el snapshot JSON. Si está corrupto y `quarantine` (solo al
+    arrancar) no se pisa en silencio: se aparta como
+    <archivo>.corrupt-<timestamp> y se sigue con una BD vacía (más lo
+    que haya en el journal). Si no, se propaga el JSONDecodeError: con
+    el bot andando puede ser una edición a medio escribir.
+    """
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return _empty_db()
+    except json.JSONDecodeError:
+        if not quarantine:
+            raise
+        corrupt = f"{path}.corrupt-{int(time.time())}"
+        os.replace(path, corrupt)
+        logger.error("Snapshot %s corrupto, movido a %s", path, corrupt)
+        return _empty_db()
+    if "approved" not in data:
+        data["approved"] = {}
+    if "pending" not in data:
+        data["pending"] = {}
+    return data
+
+def _write_snapshot(path, data):
+    # Archivo temporal + rename: un crash nunca deja el snapshot a medias
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(data, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+        bytes_written.inc(file.tell(), os.path.basename(path))
+    os.replace(tmp, path)
+
+def _apply(data, record):
+    """
+    Aplica un registro del journal. Los registros son idempotentes
+    (put/del/set con valores completos), así que re-aplicarlos sobre un
+    snapshot que ya los contiene no cambia nada.
+    """
+    section = data.setdefault(record["s"], {})
+    op = record["op"]
+    if op == "put":
+        section[record["id"]] = record["v"]
+    elif op == "del":
+        section.pop(record["id"], None)
+    elif op == "set":
+        if record["id"] in section:
+            section[record["id"]].update(record["f"])
+
+
+class UserStore:
+    """
+    Backend JSON: copia en memoria de users_db.json.
+    - Se lee del disco una sola vez y las lecturas se sirven desde memoria.
+    - Cada cambio se aplica en memoria y se añade al journal
+      (users_db.json.journal) como un registro pequeño.
+    - Un hilo de fondo compacta snapshot + journal en un snapshot nuevo.
+    - Antes de servir una lectura se compara mtime/tamaño del snapshot;
+      si alguien lo editó a mano, manda el archivo editado: del journal
+      solo se re-aplica lo escrito después de la edición (cada registro
+      lleva su hora "t") y se compacta en el acto, para que un reinicio
+      no vuelva a aplicar los registros viejos encima. Un archivo que
+      todavía no es JSON válido se ignora hasta que vuelva a cambiar;
+      solo al arrancar se aparta como corrupto.
+    - Al cerrar se compacta, así el journal queda vacío y una edición
+      con el bot parado tampoco se pisa.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal = Journal(path + '.journal')
+        self.old_journal_path = path + '.journal.1'
+        self.data = None
+        self._stamp = None
+        self._bad_stamp = None  # edición externa que no se pudo leer
+        self._generation = 0
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._writing = False  # compact() escribiendo el snapshot (no es un cambio externo)
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self, journal_records=None, quarantine=False):
+        stamp = self._file_stamp()
+        data = _read_snapshot(self.path, quarantine)
+        for record in Journal.read(self.old_journal_path):
+            _apply(data, record)
+        if journal_records is None:
+            journal_records = Journal.read(self.journal.path)
+        for record in journal_records:
+            _apply(data, record)
+        self.data = data
+        self._generation += 1
+        self._stamp = stamp if stamp == self._file_stamp() else None
+
+    def open(self):
+        """Carga snapshot + journal y arranca el hilo de fondo."""
+        with self._compact_lock, self._lock:
+            self._load(self.journal.open(), quarantine=True)
+            if self._stamp is None or os.path.exists(self.old_journal_path):
+                # No hay snapshot válido o quedó una compactación a medias:
+                # se escribe uno nuevo con todo lo recuperado.
+                _write_snapshot(self.path, self.data)
+                self.journal.truncate()
+                if os.path.exists(self.old_journal_path):
+                    os.remove(self.old_journal_path)
+                self._stamp = self._file_stamp()
+        threading.Thread(target=self._background, daemon=True).start()
+        atexit.register(self.close)
+
+    def close(self):
+        self.compact()
+        self.journal.close()
+
+    @property
+    def generation(self):
+        """
+        Cambia cada vez que la BD se recarga del disco o se reemplaza
+        entera, para invalidar índices en memoria.
+        """
+        self.load()
+        return self._generation
+
+    def snapshot(self):
+        """Lee snapshot + journal sin abrir nada para escritura."""
+        with self._lock:
+            self._load()
+            return self.data
+
+    def load(self):
+        with self._lock:
+            if self.data is None:
+                self._load()
+            elif not self._writing and self._file_stamp() not in (self._stamp, self._bad_stamp):
+                self._reload_external()
+            return self.data
+
+    def _reload_external(self):
+        """
+        El snapshot se editó por fuera: es la versión buena. Se le suman
+        solo los registros del journal posteriores a la edición y se
+        escribe todo como snapshot nuevo. Si el archivo no se puede leer
+        (p.ej. un editor lo está escribiendo) no se toca nada: se sigue
+        con la BD en memoria y el journal, y se reintenta cuando el
+        archivo vuelva a cambiar.
+        """
+        stamp = self._file_stamp()
+        edited_at = stamp[0] / 1e9 if stamp else 0
+        try:
+            data = _read_snapshot(self.path)
+        except json.JSONDecodeError:
+            logger.warning("%s editado por fuera pero no es JSON válido (¿a medio escribir?); se reintenta", self.path)
+            self._bad_stamp = stamp
+            return
+        self._bad_stamp = None
+        kept = 0
+        for path in (self.old_journal_path, self.journal.path):
+            for record in Journal.read(path):
+                if record.get("t", 0) >= edited_at:
+                    _apply(data, record)
+                    kept += 1
+        logger.warning("%s editado por fuera; se conservan %d cambios posteriores del journal", self.path, kept)
+        _write_snapshot(self.path, data)
+        self.journal.truncate()
+        if os.path.exists(self.old_journal_path):
+            os.remove(self.old_journal_path)
+        self.data = data
+        self._generation += 1
+        self._stamp = self._file_stamp()
+
+    def save(self, data):
+        # Reemplazo completo de la BD: se escribe el snapshot directamente
+        with self._compact_lock, self._lock:
+            _write_snapshot(self.path, data)
+            self.journal.truncate()
+            self.data = data
+            self._generation += 1
+            self._stamp = self._file_stamp()
+
+    def apply(self, record):
+        with self._lock:
+            _apply(self.load(), record)
+            self.journal.append(record)
+
+    def batch(self):
+        # Agrupa varios cambios: el fsync se hace después con sync()
+        return self.journal.defer()
+
+    def sync(self):
+        self.journal.sync()
+
+    # Operaciones por usuario (misma interfaz que SqliteStore)
+    def section(self, section):
+        return self.load().get(section, {})
+
+    def get(self, section, user_id):
+        return self.load().get(section, {}).get(str(user_id))
+
+    def put(self, section, user_id, value):
+        self.apply({"op": "put", "s": section, "id": str(user_id), "v": value, "t": time.time()})
+
+    def delete(self, section, user_id):
+        self.apply({"op": "del", "s": section, "id": str(user_id), "t": time.time()})
+
+    def update(self, section, user_id, fields):
+        self.apply({"op": "set", "s": section, "id": str(user_id), "f": fields, "t": time.time()})
+
+    def compact(self):
+        """
+        Escribe un snapshot nuevo sin bloquear a los escritores mientras
+        dura la escritura: se serializa la BD y se rota el journal bajo
+        el lock; el archivo se escribe fuera.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self.journal.count == 0:
+                    return
+                data = json.loads(json.dumps(self.load()))
+                self.journal.rotate(self.old_journal_path)
+                self._writing = True
+            try:
+                _write_snapshot(self.path, data)
+            finally:
+                with self._lock:
+                    self._stamp = self._file_stamp()
+                    self._writing = False
+            os.remove(self.old_journal_path)
+
+    def _background(self):
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            try:
+                self.journal.sync()
+                if self.journal.count >= COMPACT_EVERY:
+                    self.compact()
+            except Exception:
+                logger.exception("Error en el hilo de fondo de la BD")
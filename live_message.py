@@ -0,0 +1,98 @@
+# live_message.py
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+from send_queue import send_queue, PRIORITY_CHANNEL
+
+# Mínimo de segundos entre dos ediciones del mismo mensaje
+EDIT_INTERVAL = 3.0
+# Cuántos mensajes de check-in se siguen a la vez (los más recientes)
+MAX_TRACKED = 50
+
+logger = logging.getLogger(__name__)
+
+
+class _LiveMessage:
+    def __init__(self, chat_id, message_id, text, render, parse_mode, reply_markup):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.render = render
+        self.parse_mode = parse_mode
+        self.reply_markup = reply_markup
+        self.last_text = text
+        self.last_edit = time.monotonic()
+        self.task = None
+
+
+class LiveMessages:
+    """
+    Mantiene actualizados los mensajes de check-in publicados en el canal.
+    - track() registra un mensaje y la función que genera su texto.
+    - touch() avisa que algo cambió (p.ej. un conductor confirmó).
+    - Las ediciones se agrupan: como mucho una por mensaje cada
+      EDIT_INTERVAL segundos, y no se edita si el texto no cambió.
+      Una ráfaga de 500 taps termina en un puñado de ediciones.
+    - Las ediciones salen por send_queue (límites de flood y RetryAfter).
+    """
+
+    def __init__(self, interval=EDIT_INTERVAL, max_tracked=MAX_TRACKED):
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self._messages = OrderedDict()
+
+    def track(self, chat_id, message_id, text, render, parse_mode=None, reply_markup=None):
+        key = (chat_id, message_id)
+        self._messages[key] = _LiveMessage(chat_id, message_id, text, render, parse_mode, reply_markup)
+        while len(self._messages) > self.max_tracked:
+            _, old = self._messages.popitem(last=False)
+            if old.task:
+                old.task.cancel()
+
+    def untrack(self, chat_id, message_id):
+        message = self._messages.pop((chat_id, message_id), None)
+        if message and message.task:
+            message.task.cancel()
+
+    def touch(self, chat_id, message_id):
+        message = self._messages.get((chat_id, message_id))
+        if message is None or message.task is not None:
+            return  # No se sigue, o ya hay una edición pendiente
+        message.task = asyncio.create_task(self._flush(message))
+
+    async def _flush(self, message):
+        wait = message.last_edit + self.interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        # Desde aquí un touch() nuevo programa la siguiente edición;
+        # los taps que llegaron durante la espera ya entran en esta.
+        message.task = None
+        try:
+            text = message.render()
+            if text == message.last_text:
+                return
+            message.last_edit = time.monotonic()
+            try:
+                await send_queue.send(
+                    "edit_message_text",
+                    PRIORITY_CHANNEL,
+                    chat_id=message.chat_id,
+                    message_id=message.message_id,
+                    text=text,
+                    parse_mode=message.parse_mode,
+                    reply_markup=message.reply_markup
+                )
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+            message.last_text = text
+            message.last_edit = time.monotonic()
+        except Exception:
+            logger.exception("No se pudo editar el mensaje %s", message.message_id)
+
+
+live_messages = LiveMessages()
@@ -0,0 +1,142 @@
+# loop_watchdog.py
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from telegram import Update
+
+from metrics import loop_lag, loop_stall_seconds, loop_stalls, timed
+
+# Cada cuánto late el event loop y cada cuánto lo revisa el hilo (segundos)
+HEARTBEAT_INTERVAL = 0.1
+# Sin latido durante tanto tiempo se considera bloqueado (segundos)
+STALL_THRESHOLD = 0.5
+# Líneas del stack que se loguean por bloqueo
+STACK_LIMIT = 30
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+
+async def _noop():
+    pass
+
+
+# Código del wrapper de metrics.timed: su frame tiene el nombre del
+# handler y sus argumentos (update, context)
+TIMED_CODE = timed(_noop).__code__
+
+
+def describe_update(update):
+    """Tipo, usuario y callback_data de un update (sin texto: puede tener datos personales)."""
+    if not isinstance(update, Update):
+        return "-"
+    kind = next((name for name in Update.ALL_TYPES if getattr(update, name, None)), "update")
+    parts = [kind]
+    if update.effective_user:
+        parts.append(f"usuario {update.effective_user.id}")
+    if update.callback_query:
+        parts.append(f"data={update.callback_query.data!r}")
+    elif update.effective_message and (update.effective_message.text or "").startswith("/"):
+        parts.append(update.effective_message.text.split()[0])
+    return " ".join(parts)
+
+
+class LoopWatchdog:
+    """
+    Detecta bloqueos del event loop y nombra al culpable.
+    - Una tarea del loop late cada HEARTBEAT_INTERVAL y registra cuánto
+      se atrasó (bot_loop_lag_seconds).
+    - Un hilo aparte revisa el último latido. Si pasa STALL_THRESHOLD
+      sin latir, el loop está ocupado en código síncrono (p.ej. I/O de
+      la BD dentro de un handler): toma el stack del hilo del loop con
+      sys._current_frames() y busca el handler en curso (el frame de
+      metrics.timed tiene su nombre y el update).
+    - Loguea el stack con el tipo de update y el callback_data, y al
+      volver el latido suma la duración a bot_loop_stall_seconds_total
+      por handler.
+    """
+
+    def __init__(self):
+        self._beat = None
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._stall = None  # (latido en que se quedó, handler)
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + HEARTBEAT_INTERVAL
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            loop_lag.observe(max(0.0, now - expected))
+            self._beat = now
+
+    def _watch(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            beat = self._beat
+            if self._stall is None:
+                lag = time.monotonic() - beat
+                if lag > STALL_THRESHOLD:
+                    handler, details, stack = self._capture()
+                    self._stall = (beat, handler)
+                    logger.warning("Event loop bloqueado %.2fs en %s (%s)\n%s", lag, handler, details, stack)
+            elif beat != self._stall[0]:
+                start, handler = self._stall
+                duration = max(0.0, beat - start - HEARTBEAT_INTERVAL)
+                loop_stalls.inc(1, handler)
+                loop_stall_seconds.inc(duration, handler)
+                logger.warning("Event loop liberado tras %.2fs (%s)", duration, handler)
+                self._stall = None
+
+    def _capture(self):
+        """(handler, descripción del update, stack) del código que ocupa el loop."""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return "desconocido", "-", ""
+        stack = "".join(traceback.format_stack(frame)[-STACK_LIMIT:])
+        handler, details, entry = None, "-", None
+        current = frame
+        while current is not None:
+            if current.f_code is TIMED_CODE:
+                handler = current.f_locals.get("name")
+                args = current.f_locals.get("args") or ()
+                details = describe_update(args[0]) if args else "-"
+                break
+            if current.f_code.co_filename.startswith(ROOT) and current.f_code.co_filename != __file__:
+                # El frame más externo del bot (p.ej. la tarea del outbox)
+                module = os.path.splitext(os.path.basename(current.f_code.co_filename))[0]
+                entry = f"{module}.{current.f_code.co_name}"
+            current = current.f_back
+        return handler or entry or "desconocido", details, stack
+
+
+watchdog = LoopWatchdog()
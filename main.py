@@ -1,130 +1,231 @@
 # main.py
 
-from config import BOT_TOKEN, CHANNEL_ID
-from handlers import (
-    main_menu,
-    list_users,
-    remove_user,
-    confirm_remove_user,
-    delete_user,
-    edit_user,
-    request_new_name,
-    save_new_name,
-    refresh_menu,
-    back_to_menu,
-    roster_menu,  # Botón "Roster"
-    pending_requests,
-    approve_user,
-    deny_user
+import time
+
+from config import (
+    BOT_TOKEN,
+    CHANNEL_ID,
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    UPDATE_CONCURRENCY,
+    BOT_API_URL,
+    RECORD_UPDATES
 )
-from checkin_handler import (
-    register_checkin_handlers,
-    start_checkin,
-    handle_date_input,
-    ask_date_time
-)
-from database import load_users, save_database
+from handlers import main_menu
+from checkin_handler import register_checkin_handlers, fit_lines, render_checkin_text
+from shift_handler import register_shift_handlers, resume_shifts
+from export_handler import register_export_handlers
+from stats import register_stats_handlers
+from profile_handler import register_profile_handlers
+from database import get_all_users, get_user
+from write_queue import write_queue
+from live_message import live_messages
+from send_queue import send_queue, PRIORITY_CHANNEL
+from outbox import outbox
+from scheduler import scheduler
+from attendance import attendance
+from dispatcher import dispatcher
+from update_processor import KeyedUpdateProcessor
+from recorder import recorder
+from metrics import TimedRequest, instrument, metrics_server
+from loop_watchdog import watchdog
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
-    CallbackQueryHandler,
-    MessageHandler,
-    filters,
     ContextTypes
 )
 
+# Segundos que acepta check-ins el mensaje de /prueba
+PRUEBA_WINDOW = 60 * 60
+
 # Botón "Check-in"
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = str(query.from_user.id)
 
-    if query.data == "do_checkin":
-        data = load_users()
-        if user_id in data["approved"]:
-            data["approved"][user_id]["checked_in"] = True
-            save_database(data)
+    if query.data.startswith("do_checkin"):
+        # callback_data = "do_checkin:<sid>". Todo se decide en memoria:
+        # un tap en un mensaje viejo o fuera de la ventana no toca disco
+        sid = query.data.partition(":")[2]
+        if not attendance.is_open(sid):
+            await query.answer("Este check-in ya no está abierto.")
+            return
+        session = attendance.sessions[sid]
+        if user_id not in session.index:
+            await query.answer("No estás en la lista de este check-in.")
+            return
+
+        # Pasa por la cola de escritura: se confirma junto con los
+        # demás taps de la ráfaga y se responde ya guardado en disco
+        marked = await write_queue.submit(attendance.mark, session.sid, user_id)
+        if marked:
             await query.answer("¡Check-in registrado!")
+            # Refleja el check-in en el mensaje (ediciones agrupadas)
+            if query.message:
+                live_messages.touch(query.message.chat_id, query.message.message_id)
+        elif marked is False:
+            await query.answer("Ya habías hecho check-in.")
         else:
-            await query.answer("No estás en la lista aprobada.")
+            await query.answer("Este check-in ya no está abierto.")
+
+dispatcher.callback("do_checkin", button_callback)
 
 # /prueba (opcional)
 async def prueba_publicar(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [[InlineKeyboardButton("Check-in", callback_data="do_checkin")]]
+    # Sesión de prueba con todos los conductores registrados
+    end = time.time() + PRUEBA_WINDOW
+    session = await write_queue.submit(attendance.open_session, list(get_all_users()), None, end, "Prueba")
+    keyboard = [[InlineKeyboardButton("Check-in", callback_data=f"do_checkin:{session.sid}")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    data = load_users()
-    text_lines = ["Usuarios registrados:"]
-    for uid, info in data["approved"].items():
-        status = "✅" if info.get("checked_in") else "❌"
-        text_lines.append(f"- {info['name']} {status}")
-
-    await context.bot.send_message(
+    text = render_prueba_text(session)
+    message = await send_queue.send(
+        "send_message",
+        PRIORITY_CHANNEL,
         chat_id=CHANNEL_ID,
-        text="\n".join(text_lines),
+        text=text,
         reply_markup=reply_markup
     )
-
-# Maneja la lista de nombres cuando se pulsa “Roster”
-async def handle_roster_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if context.user_data.get("waiting_for_roster"):
-        context.user_data["waiting_for_roster"] = False
-        await start_checkin(update, context)
-    else:
-        pass
-
-def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    attendance.attach(session.sid, message.chat_id, message.message_id)
+    live_messages.track(message.chat_id, message.message_id, text,
+                        lambda: render_prueba_text(session), reply_markup=reply_markup)
+
+def render_prueba_text(session):
+    # Solo se listan los que faltan, recortado al límite de Telegram
+    missing = []
+    for uid in session.absent():
+        info = get_user(uid)
+        if info:
+            missing.append(f"- {info['name']} ❌")
+    return fit_lines(f"Usuarios registrados: {session.count} de {len(session)} ✅\n", missing)
+
+def resume_live_messages():
+    """
+    Tras un reinicio con un check-in abierto los taps se siguen
+    aceptando; aquí se vuelve a seguir su mensaje del canal (guardado
+    con attendance.attach) para que siga mostrando quién falta.
+    """
+    for session in attendance.open_sessions():
+        if session.message is None:
+            continue  # Todavía en el outbox: se sigue al publicarse
+        chat_id, message_id = session.message
+        reply_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton("Check-in", callback_data=f"do_checkin:{session.sid}")]]
+        )
+        if session.label == "Prueba":
+            live_messages.track(chat_id, message_id, None,
+                                lambda session=session: render_prueba_text(session), reply_markup=reply_markup)
+        else:
+            live_messages.track(chat_id, message_id, None,
+                                lambda session=session: render_checkin_text(session),
+                                parse_mode="HTML", reply_markup=reply_markup)
+        # Los taps que llegaron antes de la caída quizá no se reflejaron
+        live_messages.touch(chat_id, message_id)
+
+# Arranque / parada de las tareas de fondo
+async def on_startup(app):
+    metrics_server.start()  # /metrics, si METRICS_PORT está configurado
+    watchdog.start()        # Avisa si algún handler bloquea el event loop
+    attendance.start()  # Sesiones de check-in del mes actual y el anterior
+    write_queue.register_batch(attendance.batch)
+    write_queue.register_sync(attendance.sync)
+    write_queue.start()
+    send_queue.start(app.bot)
+    resume_live_messages()  # Mensajes de check-in que seguían abiertos
+    outbox.start()  # Re-envía lo que quedó pendiente
+    scheduler.start(app)  # Recupera los check-ins programados
+    resume_shifts()       # Cada turno recurrente con su próxima apertura
+
+async def on_shutdown(app):
+    await watchdog.stop()
+    await scheduler.stop()
+    await outbox.stop()
+    await send_queue.stop()
+    await write_queue.stop()
+    attendance.stop()
+    recorder.close()
+    metrics_server.stop()
+
+def build_application(base_url=None):
+    """
+    Arma la Application con todos los handlers, sin arrancarla.
+    `base_url` permite apuntar a otro Bot API (p.ej. el falso de
+    benchmarks/fake_bot_api.py); por defecto config.BOT_API_URL.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        # Updates de distintos usuarios en paralelo; un aprobado lento
+        # no frena los taps de check-in de los demás
+        .concurrent_updates(KeyedUpdateProcessor(UPDATE_CONCURRENCY))
+        # Mide la latencia de cada llamada al Bot API (256 = el pool por defecto de PTB)
+        .request(TimedRequest(connection_pool_size=256))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    base_url = base_url or BOT_API_URL
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
 
     # 1) Handlers de comandos
     app.add_handler(CommandHandler("start", main_menu))
     app.add_handler(CommandHandler("prueba", prueba_publicar))
 
-    # 2) Botones principales (CallbackQueryHandler) – Menú Admin
-    app.add_handler(CallbackQueryHandler(list_users, pattern="^list_users$"))
-    app.add_handler(CallbackQueryHandler(remove_user, pattern="^remove_user$"))
-    app.add_handler(CallbackQueryHandler(confirm_remove_user, pattern="^remove_.*"))
-    app.add_handler(CallbackQueryHandler(confirm_remove_user, pattern="^confirm_remove_.*"))
-    app.add_handler(CallbackQueryHandler(delete_user, pattern="^delete_.*"))
-    app.add_handler(CallbackQueryHandler(edit_user, pattern="^edit_user$"))
-    app.add_handler(CallbackQueryHandler(request_new_name, pattern="^edit_.*"))
-    app.add_handler(CallbackQueryHandler(refresh_menu, pattern="^refresh$"))
-    app.add_handler(CallbackQueryHandler(back_to_menu, pattern="^back$"))
-    app.add_handler(CallbackQueryHandler(roster_menu, pattern="^roster$"))
-    # OJO: Ajusta el pattern a lo que tengas en el botón Roster, p.ej. "^roster$"
-
-    # 3) Subflujos (ej. pedir fecha/hora)
-    #    Si "ask_date_time" está en checkin_handler.py, impórtalo y agrégalo aquí.
-    app.add_handler(CallbackQueryHandler(ask_date_time, pattern="^ask_date_time$"))
-
-    # 4) Maneja fecha/hora del check-in (nuevo flujo)
-    #    Este MessageHandler se activa cuando user_data["waiting_for_date_time"] = True
-    #    y el usuario escribe "2025-01-07 07:00-08:30", etc.
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_date_input))
-
-    # 5) Maneja la lista de nombres (cuando se pulsa “Roster” y se setea waiting_for_roster)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_roster_text))
-
-    # 6) Resto de tus flujos antiguos (procesos extra).
-    #    Si ya no usas process_all, quítalo.
-    # app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_all))  # <-- QUITA si no lo usas
-
-    # 7) Resto de CallbackQueryHandlers (Aprobar/Denegar usuarios)
-    app.add_handler(CallbackQueryHandler(pending_requests, pattern="^pending_requests$"))
-    app.add_handler(CallbackQueryHandler(approve_user, pattern="^approve_.*"))
-    app.add_handler(CallbackQueryHandler(deny_user, pattern="^deny_.*"))
-
-    # 8) Handlers genéricos de mensajes (si usas save_new_name o similar)
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, save_new_name))
-
-    # 9) Registra handlers específicos del checkin_handler
+    # 2) Botones y texto libre: un solo dispatcher (ver dispatcher.py).
+    #    Las rutas del menú admin están en handlers.py y las del roster
+    #    en checkin_handler.py
+    dispatcher.register(app)
+
+    # 3) Registra handlers específicos del checkin_handler
     register_checkin_handlers(app)
 
-    # 10) Botón "Check-in"
-    app.add_handler(CallbackQueryHandler(button_callback, pattern="^do_checkin$"))
+    # Turnos recurrentes (/turno, /turnos, /borrar_turno)
+    register_shift_handlers(app)
+
+    # Exportación de asistencia (/exportar)
+    register_export_handlers(app)
+
+    # Estadísticas de asistencia (/stats)
+    register_stats_handlers(app)
 
-    # 11) Corre la app
-    app.run_polling()
+    # Perfil bajo demanda (/profile <segundos>)
+    register_profile_handlers(app)
+
+    # Tiempo de cada handler (las rutas del dispatcher se miden solas)
+    instrument(app, skip=(dispatcher.dispatch_callback, dispatcher.dispatch_text))
+    return app
+
+def main():
+    # Sin secreto cualquiera que adivine la URL podría mandar updates
+    # falsos (p.ej. un callback "approve:" como si fuera el admin)
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        raise SystemExit("WEBHOOK_URL requiere WEBHOOK_SECRET en config.py")
+
+    app = build_application()
+
+    # Grabación opcional de los updates (ver recorder.py)
+    if RECORD_UPDATES:
+        app.update_processor.observe(recorder.record)
+
+    # 4) Corre la app: webhook si está configurado (Telegram empuja los
+    #     updates, sin la latencia del long polling), si no polling
+    if WEBHOOK_URL:
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
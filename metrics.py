@@ -0,0 +1,210 @@
+# metrics.py
+
+import bisect
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram.request import HTTPXRequest
+
+from config import METRICS_LISTEN, METRICS_PORT
+
+# Límites de los histogramas (segundos)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values = {}  # valores de las etiquetas -> total
+
+    def inc(self, amount=1, *labels):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(list(self._values.items())):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = buckets
+        self._series = {}  # valores de las etiquetas -> [cuentas por bucket, suma]
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # Un contador por bucket (no acumulado) + el de +Inf
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(list(self._series.items())):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(counts)):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                extra = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, extra)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+handler_seconds = Histogram("bot_handler_seconds", "Duración de handlers y trabajos", ("handler",))
+handler_errors = Counter("bot_handler_errors_total", "Handlers y trabajos que terminaron con excepción", ("handler",))
+db_operations = Counter("bot_db_operations_total", "Llamadas a la BD de usuarios", ("op", "kind"))
+db_seconds = Histogram("bot_db_seconds", "Duración de las operaciones de BD completas", ("op",))
+bytes_written = Counter("bot_storage_bytes_written_total", "Bytes escritos a disco", ("file",))
+api_seconds = Histogram("bot_api_seconds", "Latencia de las llamadas al Bot API", ("method",))
+api_errors = Counter("bot_api_errors_total", "Llamadas al Bot API sin status 200", ("method", "status"))
+loop_lag = Histogram("bot_loop_lag_seconds", "Atraso del latido del event loop")
+loop_stalls = Counter("bot_loop_stalls_total", "Bloqueos del event loop", ("handler",))
+loop_stall_seconds = Counter("bot_loop_stall_seconds_total", "Tiempo con el event loop bloqueado", ("handler",))
+
+REGISTRY = [handler_seconds, handler_errors, db_operations, db_seconds, bytes_written, api_seconds, api_errors,
+            loop_lag, loop_stalls, loop_stall_seconds]
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed(callback, name=None):
+    """Envuelve un handler/trabajo async para medir su duración."""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            handler_errors.inc(1, name)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - start, name)
+
+    return wrapper
+
+
+def instrument(app, skip=()):
+    """
+    Mide todos los handlers registrados en la app. Los de `skip` (el
+    dispatcher) ya miden cada ruta por separado.
+    """
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            if handler.callback not in skip:
+                handler.callback = timed(handler.callback)
+
+
+def db_op(kind, measure=False):
+    """
+    Decorador para las funciones de database.py: cuenta lecturas y
+    escrituras; con measure=True también mide la duración (load/save de
+    la BD completa, que son las caras).
+    """
+    def decorator(fn):
+        op = fn.__name__
+        if measure:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                db_operations.inc(1, op, kind)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    db_seconds.observe(time.perf_counter() - start, op)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                db_operations.inc(1, op, kind)
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest que mide cada llamada al Bot API por método."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            api_errors.inc(1, api_method, "error")
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - start, api_method)
+        if status != 200:
+            api_errors.inc(1, api_method, str(status))
+        return status, payload
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """
+    Endpoint HTTP /metrics (formato de texto de Prometheus).
+    - Corre en su propio hilo: se puede consultar aunque el event loop
+      esté ocupado.
+    - Lee los dicts de las métricas sin lock (se copian con list());
+      en el peor caso un scrape ve una observación a medias.
+    """
+
+    def __init__(self, port=METRICS_PORT, listen=METRICS_LISTEN):
+        self.port, self.listen = port, listen
+        self._server = None
+
+    def start(self):
+        if not self.port:
+            return
+        self._server = ThreadingHTTPServer((self.listen, self.port), _MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logger.info("Métricas en http://%s:%d/metrics", self.listen, self.port)
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+metrics_server = MetricsServer()
@@ -0,0 +1,155 @@
+# name_index.py
+
+import bisect
+import heapq
+import unicodedata
+from collections import Counter
+
+
+def normalize_name(name):
+    """
+    Forma canónica de un nombre para comparar:
+    minúsculas (casefold), sin tildes y con los espacios colapsados.
+    "  José   PÉREZ " -> "jose perez"
+    """
+    text = unicodedata.normalize("NFKD", name.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+
+def trigrams(key):
+    """Trigramas de un nombre ya normalizado, con relleno en los bordes."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Índice nombre normalizado -> conductor aprobado.
+    Se construye una vez y se mantiene con add/remove al aprobar,
+    editar o eliminar usuarios, así resolver un roster es una
+    búsqueda en dict por línea en vez de recorrer toda la BD.
+    También guarda un índice invertido de trigramas para sugerir
+    nombres parecidos ("¿quisiste decir...?").
+    """
+
+    def __init__(self):
+        self._by_name = {}  # nombre normalizado -> {user_id: info}
+        self._names = {}    # user_id -> nombre normalizado
+        self._grams = {}    # trigrama -> {nombres normalizados}
+        self._gram_count = {}  # nombre normalizado -> nº de trigramas
+
+    def build(self, users):
+        self._by_name.clear()
+        self._names.clear()
+        self._grams.clear()
+        self._gram_count.clear()
+        for user_id, info in users.items():
+            self.add(user_id, info)
+
+    def add(self, user_id, info):
+        user_id = str(user_id)
+        self.remove(user_id)
+        key = normalize_name(info["name"])
+        if key not in self._by_name:
+            self._by_name[key] = {}
+            grams = trigrams(key)
+            for gram in grams:
+                self._grams.setdefault(gram, set()).add(key)
+            self._gram_count[key] = len(grams)
+        self._by_name[key][user_id] = info
+        self._names[user_id] = key
+
+    def remove(self, user_id):
+        key = self._names.pop(str(user_id), None)
+        if key is not None:
+            bucket = self._by_name[key]
+            bucket.pop(str(user_id), None)
+            if not bucket:
+                del self._by_name[key]
+                del self._gram_count[key]
+                for gram in trigrams(key):
+                    keys = self._grams[gram]
+                    keys.discard(key)
+                    if not keys:
+                        del self._grams[gram]
+
+    def lookup(self, name):
+        """Devuelve el conductor con ese nombre (el primero si hay varios) o None."""
+        bucket = self._by_name.get(normalize_name(name))
+        if bucket:
+            return next(iter(bucket.values()))
+        return None
+
+    def suggest(self, name, limit=3, min_score=0.4):
+        """
+        Conductores con nombre parecido a `name`, de más a menos similar.
+        Solo se comparan los nombres que comparten algún trigrama
+        (coeficiente de Dice sobre trigramas), no toda la BD.
+        """
+        grams = trigrams(normalize_name(name))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        scored = (
+            (2 * count / (len(grams) + self._gram_count[key]), key)
+            for key, count in shared.items()
+        )
+        best = heapq.nlargest(limit, (item for item in scored if item[0] >= min_score))
+        return [next(iter(self._by_name[key].values())) for _, key in best]
+
+    def __len__(self):
+        return len(self._names)
+
+
+class SortedUsers:
+    """
+    Usuarios ordenados por nombre (normalizado) para las listas paginadas
+    del admin. Se mantiene con add/remove; una página se obtiene con
+    bisect + slice, O(log n + tamaño de página) sin importar la flota.
+    """
+
+    def __init__(self):
+        self._keys = []   # (nombre normalizado, user_id), ordenado
+        self._key_of = {}  # user_id -> clave
+        self._info = {}    # user_id -> datos
+
+    def build(self, users):
+        self._key_of = {str(uid): (normalize_name(info["name"]), str(uid)) for uid, info in users.items()}
+        self._info = {str(uid): info for uid, info in users.items()}
+        self._keys = sorted(self._key_of.values())
+
+    def add(self, user_id, info):
+        user_id = str(user_id)
+        self.remove(user_id)
+        key = (normalize_name(info["name"]), user_id)
+        bisect.insort(self._keys, key)
+        self._key_of[user_id] = key
+        self._info[user_id] = info
+
+    def remove(self, user_id):
+        key = self._key_of.pop(str(user_id), None)
+        if key is not None:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+            del self._info[str(user_id)]
+
+    def page(self, cursor=None, backwards=False, size=10):
+        """
+        Devuelve (usuarios, hay_anterior, hay_siguiente).
+        `cursor` es el user_id del borde de la página actual: la página
+        siguiente empieza justo después de él y la anterior termina
+        justo antes. Si el cursor ya no existe se vuelve al principio.
+        """
+        key = self._key_of.get(str(cursor)) if cursor else None
+        if key is None:
+            start = 0
+        elif backwards:
+            start = max(0, bisect.bisect_left(self._keys, key) - size)
+        else:
+            start = bisect.bisect_right(self._keys, key)
+        keys = self._keys[start:start + size]
+        users = [(uid, self._info[uid]) for _, uid in keys]
+        return users, start > 0, start + size < len(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,188 @@
+# outbox.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden
+
+from journal import Journal
+from send_queue import send_queue, PRIORITY_BULK
+
+OUTBOX_FILE = 'outbox.journal'
+DEAD_LETTER_FILE = 'outbox_dead.jsonl'
+
+# Reintentos: backoff exponencial con jitter, hasta MAX_ATTEMPTS envíos
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 2.0   # segundos
+BACKOFF_MAX = 600.0  # segundos
+# Se compacta el archivo cuando acumula tantos registros
+COMPACT_EVERY = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Notificaciones persistentes.
+    - notify() guarda el mensaje en disco (outbox.journal) antes de
+      intentar enviarlo.
+    - Un worker lo entrega por send_queue; si falla lo reintenta con
+      backoff exponencial + jitter.
+    - Tras MAX_ATTEMPTS (o un error definitivo, p.ej. el usuario bloqueó
+      el bot) pasa a outbox_dead.jsonl.
+    - Al arrancar se vuelve a cargar lo que quedó pendiente.
+    - `on_sent` nombra un hook (ver register_hook) que recibe el mensaje
+      enviado; sirve para acciones posteriores que deben sobrevivir a
+      un reinicio (p.ej. seguir el mensaje de check-in).
+    """
+
+    def __init__(self, path=OUTBOX_FILE, dead_path=DEAD_LETTER_FILE):
+        self.journal = Journal(path)
+        self.dead = Journal(dead_path)
+        self.entries = {}   # id -> registro pendiente
+        self.dead_count = 0
+        self._heap = []     # (enviar_en, id)
+        self._hooks = {}
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self._ids = itertools.count(int(time.time() * 1000))
+
+    def register_hook(self, name, fn):
+        self._hooks[name] = fn
+
+    def start(self):
+        for record in self.journal.open():
+            op = record["op"]
+            if op == "add":
+                self.entries[record["id"]] = record
+            elif op == "retry" and record["id"] in self.entries:
+                self.entries[record["id"]].update(attempts=record["attempts"], next_at=record["next_at"])
+            elif op in ("done", "dead"):
+                self.entries.pop(record["id"], None)
+        self.dead_count = len(self.dead.open())
+        self._compact()
+        self._heap = [(entry["next_at"], entry["id"]) for entry in self.entries.values()]
+        heapq.heapify(self._heap)
+        if self.entries:
+            logger.info("Outbox: %d notificaciones pendientes", len(self.entries))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.journal.close()
+        self.dead.close()
+
+    def _compact(self):
+        # Solo quedan los pendientes, con sus intentos actuales
+        self.journal.rewrite(list(self.entries.values()))
+
+    async def notify(self, method, priority=PRIORITY_BULK, on_sent=None, hook_data=None, **kwargs):
+        """
+        Guarda bot.<method>(**kwargs) en el outbox y vuelve cuando está
+        en disco. El envío lo hace el worker.
+        """
+        if isinstance(kwargs.get("reply_markup"), InlineKeyboardMarkup):
+            kwargs["reply_markup"] = kwargs["reply_markup"].to_dict()
+        entry = {
+            "op": "add",
+            "id": next(self._ids),
+            "method": method,
+            "priority": priority,
+            "kwargs": kwargs,
+            "on_sent": on_sent,
+            "hook_data": hook_data,
+            "attempts": 0,
+            "next_at": time.time(),
+        }
+        # Se registra en memoria antes del fsync para que una compactación
+        # concurrente no lo deje fuera del archivo
+        self.entries[entry["id"]] = entry
+        self.journal.append(entry)
+        await asyncio.to_thread(self.journal.sync)
+        heapq.heappush(self._heap, (entry["next_at"], entry["id"]))
+        self._wakeup.set()
+        return entry["id"]
+
+    def stats(self):
+        return {"pending": len(self.entries), "dead": self.dead_count}
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, entry_id = heapq.heappop(self._heap)
+                entry = self.entries.get(entry_id)
+                if entry is None:
+                    continue
+                task = asyncio.create_task(self._deliver(entry))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, entry):
+        kwargs = dict(entry["kwargs"])
+        if isinstance(kwargs.get("reply_markup"), dict):
+            kwargs["reply_markup"] = InlineKeyboardMarkup.de_json(kwargs["reply_markup"], None)
+        try:
+            result = await send_queue.send(entry["method"], entry["priority"], **kwargs)
+        except (Forbidden, BadRequest) as e:
+            # Error definitivo: reintentar no va a servir
+            self._bury(entry, e)
+            return
+        except Exception as e:
+            attempts = entry["attempts"] + 1
+            if attempts >= MAX_ATTEMPTS:
+                self._bury(entry, e)
+                return
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts) * random.uniform(0.5, 1.5)
+            entry.update(attempts=attempts, next_at=time.time() + delay)
+            self.journal.append({"op": "retry", "id": entry["id"], "attempts": attempts,
+                                 "next_at": entry["next_at"], "error": repr(e)})
+            heapq.heappush(self._heap, (entry["next_at"], entry["id"]))
+            self._wakeup.set()
+            logger.warning("Outbox %s: intento %d fallido (%r), reintento en %.0fs",
+                           entry["id"], attempts, e, delay)
+            return
+
+        self._finish(entry, {"op": "done", "id": entry["id"]})
+        hook = self._hooks.get(entry.get("on_sent"))
+        if hook:
+            try:
+                hook(result, entry.get("hook_data"))
+            except Exception:
+                logger.exception("Error en el hook %s", entry["on_sent"])
+
+    def _bury(self, entry, error):
+        logger.error("Outbox %s enviado a dead-letter: %r", entry["id"], error)
+        self.dead.append(dict(entry, op="dead", error=repr(error), failed_at=time.time()))
+        self.dead.sync()
+        self.dead_count += 1
+        self._finish(entry, {"op": "dead", "id": entry["id"]})
+
+    def _finish(self, entry, record):
+        self.entries.pop(entry["id"], None)
+        self.journal.append(record)
+        if self.journal.count >= COMPACT_EVERY:
+            self._compact()
+
+
+outbox = Outbox()
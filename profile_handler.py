@@ -0,0 +1,120 @@
+# profile_handler.py
+
+import asyncio
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from config import ADMIN_ID
+from send_queue import send_queue, PRIORITY_ADMIN
+
+# Duración por defecto y máxima de /profile (segundos)
+PROFILE_DEFAULT = 30
+PROFILE_MAX = 300
+# Funciones que se listan en la respuesta
+PROFILE_TOP = 20
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Perfil en curso (solo uno a la vez: cProfile usa el hook de profiling del hilo)
+_active = None
+
+
+def _is_bot_code(filename):
+    return filename.startswith(ROOT) and "site-packages" not in filename
+
+
+def top_functions(profiler, limit=PROFILE_TOP):
+    """
+    Las funciones del bot con más tiempo acumulado. Las de asyncio,
+    PTB, httpx, etc. quedan en el archivo completo; aquí solo se listan
+    las propias, que son las que se pueden arreglar.
+    """
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.items():
+        if _is_bot_code(filename):
+            rows.append((cumulative, own, calls, f"{os.path.relpath(filename, ROOT)}:{line}({function})"))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def render_profile(rows, seconds):
+    if not rows:
+        return f"Perfil de {seconds}s: no corrió código del bot en ese tiempo."
+    lines = [f"⏱ Perfil de {seconds}s – acumulado / propio / llamadas", ""]
+    for cumulative, own, calls, name in rows:
+        lines.append(f"{cumulative:.3f}s / {own:.3f}s / {calls} – {name}")
+    return "\n".join(lines)
+
+
+async def _finish_profile(profiler, seconds, chat_id):
+    global _active
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        _active = None
+
+    rows = top_functions(profiler)
+    fd, path = tempfile.mkstemp(prefix="perfil_", suffix=".prof")
+    os.close(fd)
+    try:
+        profiler.dump_stats(path)
+        await send_queue.send("send_message", PRIORITY_ADMIN, chat_id=chat_id, text=render_profile(rows, seconds))
+        with open(path, "rb") as file:
+            await send_queue.send(
+                "send_document",
+                PRIORITY_ADMIN,
+                chat_id=chat_id,
+                document=file,
+                filename=f"perfil_{time.strftime('%Y%m%d_%H%M%S')}.prof",
+                caption="Abrir con: python -m pstats perfil.prof (o snakeviz)",
+                read_timeout=120,
+                write_timeout=120
+            )
+    finally:
+        os.remove(path)
+
+
+# /profile [segundos] — perfila todos los handlers durante la ventana (solo admin)
+async def start_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global _active
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    args = context.args or []
+    try:
+        seconds = int(args[0]) if args else PROFILE_DEFAULT
+        if not 1 <= seconds <= PROFILE_MAX:
+            raise ValueError("Fuera de rango")
+    except ValueError:
+        await update.message.reply_text(
+            f"Uso: /profile [segundos]  (1-{PROFILE_MAX}, por defecto {PROFILE_DEFAULT})"
+        )
+        return
+    if _active is not None:
+        await update.message.reply_text("Ya hay un perfil en curso.")
+        return
+
+    # cProfile mide todo lo que corre en el hilo del event loop, o sea
+    # todos los handlers y tareas de fondo. Lo que va en hilos aparte
+    # (asyncio.to_thread, fsync de los journals) no aparece.
+    _active = cProfile.Profile()
+    _active.enable()
+    await update.message.reply_text(
+        f"Perfilando durante {seconds}s. El bot va más lento mientras tanto; "
+        "al terminar llega el resumen y el archivo completo."
+    )
+    # La espera va en una tarea aparte: este handler termina ya y no
+    # deja al admin bloqueado (sus updates van en orden) durante la ventana
+    context.application.create_task(_finish_profile(_active, seconds, update.effective_chat.id))
+
+
+def register_profile_handlers(app):
+    app.add_handler(CommandHandler("profile", start_profile))
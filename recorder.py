@@ -0,0 +1,170 @@
+# recorder.py
+
+import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+from telegram import Update
+
+from config import ADMIN_ID, CHANNEL_ID, RECORD_UPDATES, RECORD_ANONYMIZE_KEY
+
+# Cada cuánto se vacía el buffer del gzip a disco (segundos)
+RECORD_FLUSH = 5.0
+
+# Objetos del update que describen a una persona o un chat
+PERSON_KEYS = {"from", "chat", "user", "sender_chat", "forward_from", "via_bot"}
+
+logger = logging.getLogger(__name__)
+
+
+class Pseudonymizer:
+    """
+    Reemplaza ids y datos personales por seudónimos estables (HMAC con
+    una clave): el mismo usuario queda con el mismo id en toda la
+    grabación y en la copia de la BD del replay (ver benchmarks/replay.py).
+    - El admin y el canal conservan su id: los handlers los comparan
+      con config.
+    - Nombres y usernames se reemplazan; el texto solo se conserva en
+      los updates del admin (rosters, nombres nuevos), que hacen falta
+      para reproducir la mañana. De los demás queda solo el comando.
+    - En los callbacks se reemplazan los ids ("approve:<uid>", ...),
+      también en el callback_data de los botones.
+    - Del mensaje del bot que viene con cada callback no queda texto
+      (ni el de los botones), tampoco en los updates del admin.
+    """
+
+    def __init__(self, key):
+        self._key = key.encode()
+
+    def _digest(self, value):
+        return hmac.new(self._key, str(value).encode(), hashlib.sha256).hexdigest()
+
+    def id(self, value):
+        value = int(value)
+        if value in (ADMIN_ID, CHANNEL_ID):
+            return value
+        pseudo = 10 ** 9 + int(self._digest(abs(value))[:10], 16) % (9 * 10 ** 9)
+        return -pseudo if value < 0 else pseudo
+
+    def callback_data(self, data):
+        # Los ids van como segmentos numéricos largos ("list_users:n:<uid>")
+        return ":".join(str(self.id(part)) if part.isdigit() and len(part) >= 5 else part
+                        for part in data.split(":"))
+
+    def _person(self, person):
+        person = dict(person)
+        if "id" in person:
+            person["id"] = self.id(person["id"])
+        for field in ("first_name", "title"):
+            if field in person:
+                person[field] = f"Usuario {self._digest(person.get('username') or person['id'])[:6]}"
+        person.pop("last_name", None)
+        if "username" in person:
+            person["username"] = f"u{self._digest(person['username'])[:8]}"
+        return person
+
+    def _walk(self, value, admin, echo=False):
+        if isinstance(value, list):
+            return [self._walk(item, admin, echo) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            if key in PERSON_KEYS and isinstance(item, dict):
+                result[key] = self._person(item)
+            elif key in ("data", "callback_data") and isinstance(item, str):
+                result[key] = self.callback_data(item)
+            elif key in ("text", "caption") and isinstance(item, str) and (echo or not admin):
+                result[key] = item.split()[0] if item.startswith("/") and not echo else ""
+            elif key in ("entities", "caption_entities") and (echo or not admin):
+                result[key] = [e for e in item if e.get("type") == "bot_command" and e.get("offset") == 0 and not echo]
+            elif key == "message" and "chat_instance" in value:
+                # Mensaje del propio bot que trae el callback (check-in,
+                # listas del admin): su texto y sus botones llevan nombres
+                result[key] = self._walk(item, admin, echo=True)
+            else:
+                result[key] = self._walk(item, admin, echo)
+        return result
+
+    def update(self, update):
+        """Dict del update (Update.to_dict()) con los datos reemplazados."""
+        user = update.effective_user
+        return self._walk(update.to_dict(), admin=user is not None and user.id == ADMIN_ID)
+
+
+class UpdateRecorder:
+    """
+    Graba cada update entrante en JSONL comprimido (gzip), una línea
+    {"t": hora de llegada, "update": ...} por update, para reproducir
+    después una mañana real con benchmarks/replay.py.
+    - Se activa con config.RECORD_UPDATES (ruta con formato strftime,
+      un archivo por día); con RECORD_ANONYMIZE_KEY se graba seudonimizado.
+    - Se engancha al update processor (observe), así la hora es la de
+      llegada y no la de procesamiento, aunque el update espere turno.
+    - gzip se abre en modo append: cada reinicio agrega un miembro nuevo
+      al archivo, que se lee como uno solo.
+    """
+
+    def __init__(self, path_pattern=RECORD_UPDATES, key=RECORD_ANONYMIZE_KEY):
+        self.path_pattern = path_pattern
+        self._pseudonymizer = Pseudonymizer(key) if key else None
+        self._file = None
+        self._path = None
+        self._last_flush = 0.0
+        self.recorded = 0
+
+    def _open(self, now):
+        path = datetime.datetime.fromtimestamp(now).strftime(self.path_pattern)
+        if path == self._path:
+            return
+        self.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._path = path
+        logger.info("Grabando updates en %s", path)
+
+    def record(self, update):
+        if not isinstance(update, Update):
+            return
+        now = time.time()
+        try:
+            data = self._pseudonymizer.update(update) if self._pseudonymizer else update.to_dict()
+            self._open(now)
+            self._file.write(json.dumps({"t": now, "update": data}, ensure_ascii=False) + "\n")
+        except Exception:
+            # Grabar nunca debe frenar al bot
+            logger.exception("No se pudo grabar el update %s", update.update_id)
+            return
+        self.recorded += 1
+        if now - self._last_flush >= RECORD_FLUSH:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+            self._path = None
+
+    @staticmethod
+    def read(path):
+        """Itera los registros de una grabación (tolera una última línea cortada)."""
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            try:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Línea corrupta en %s", path)
+            except EOFError:
+                logger.warning("%s termina a medias (el bot no se cerró limpio)", path)
+
+
+recorder = UpdateRecorder()
@@ -0,0 +1,163 @@
+# scheduler.py
+
+import asyncio
+import heapq
+import logging
+import time
+
+from journal import Journal
+from metrics import timed
+
+SCHEDULE_FILE = 'schedule.journal'
+# Se compacta el archivo cuando acumula tantos registros
+COMPACT_EVERY = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+
+class JobContext:
+    """Lo que los callbacks usan del CallbackContext de PTB."""
+
+    def __init__(self, app, name, data):
+        self.application = app
+        self.bot = app.bot
+        self.job = _Job(name, data)
+
+
+class Scheduler:
+    """
+    Trabajos programados que sobreviven a reinicios.
+    - Cada trabajo (id, tipo, hora, datos) se guarda en schedule.journal.
+    - En memoria: min-heap por hora de disparo. Al arrancar se cargan
+      todos de una vez (heapify) y los vencidos se disparan enseguida.
+    - Al vencer, se lanza el callback registrado para su tipo en una
+      tarea propia, con un JobContext (context.job.data, context.bot,
+      context.application). No depende del JobQueue de PTB, que necesita
+      el extra "job-queue".
+    - Un trabajo que falla se loguea y no frena a los demás.
+    """
+
+    def __init__(self, path=SCHEDULE_FILE):
+        self.journal = Journal(path)
+        self.jobs = {}      # id -> trabajo
+        self._heap = []     # (hora, id)
+        self._callbacks = {}
+        self._next_id = 1
+        self._app = None
+        self._wakeup = None
+        self._task = None
+        self._running = set()  # Tareas de trabajos en curso
+
+    def register(self, kind, callback):
+        self._callbacks[kind] = timed(callback)
+
+    def start(self, app):
+        for record in self.journal.open():
+            if record["op"] == "add":
+                self.jobs[record["id"]] = record
+            elif record["op"] == "del":
+                self.jobs.pop(record["id"], None)
+            self._next_id = max(self._next_id, int(record["id"]) + 1)
+        self.journal.rewrite(list(self.jobs.values()))
+        self._heap = [(job["fire_at"], job["id"]) for job in self.jobs.values()]
+        heapq.heapify(self._heap)
+        if self.jobs:
+            logger.info("Scheduler: %d trabajos pendientes", len(self.jobs))
+        self._app = app
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.journal.close()
+
+    def add(self, kind, when, data=None, label=None):
+        """Programa un trabajo para `when` (datetime) y devuelve su id."""
+        job = {
+            "op": "add",
+            "id": str(self._next_id),
+            "kind": kind,
+            "fire_at": when.timestamp(),
+            "label": label or kind,
+            "data": data or {},
+        }
+        self._next_id += 1
+        self.journal.append(job)
+        self.journal.sync()
+        self.jobs[job["id"]] = job
+        heapq.heappush(self._heap, (job["fire_at"], job["id"]))
+        if self._wakeup:
+            self._wakeup.set()
+        return job["id"]
+
+    def cancel(self, job_id):
+        """Cancela un trabajo; devuelve False si no existe."""
+        if self.jobs.pop(str(job_id), None) is None:
+            return False
+        self._delete(str(job_id))
+        return True
+
+    def pending(self, kind=None):
+        """Trabajos pendientes ordenados por hora."""
+        jobs = sorted(self.jobs.values(), key=lambda job: job["fire_at"])
+        return [job for job in jobs if kind is None or job["kind"] == kind]
+
+    def _delete(self, job_id):
+        # El heap se limpia solo: las entradas sin trabajo se ignoran al salir
+        self.journal.append({"op": "del", "id": job_id})
+        self.journal.sync()
+        if self.journal.count >= COMPACT_EVERY:
+            self.journal.rewrite(list(self.jobs.values()))
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._heap)
+                job = self.jobs.pop(job_id, None)
+                if job is None:
+                    continue  # Cancelado
+                try:
+                    self._fire(job)
+                    self._delete(job_id)
+                except Exception:
+                    logger.exception("No se pudo lanzar el trabajo %s", job_id)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _fire(self, job):
+        callback = self._callbacks.get(job["kind"])
+        if callback is None:
+            logger.error("Trabajo %s de tipo desconocido: %s", job["id"], job["kind"])
+            return
+        name = f"{job['kind']}:{job['id']}"
+        context = JobContext(self._app, name, dict(job["data"], job_id=job["id"]))
+        task = asyncio.create_task(self._run_job(callback, context))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run_job(self, callback, context):
+        try:
+            await callback(context)
+        except Exception:
+            logger.exception("Falló el trabajo %s", context.job.name)
+
+
+scheduler = Scheduler()
@@ -0,0 +1,223 @@
+# send_queue.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+
+# Límites de Telegram: ~30 mensajes/s en total, 1/s por chat privado
+# y ~20/min por grupo o canal
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+# Máximo de mensajes en cola; por encima se descartan los masivos
+MAX_QUEUE = 10000
+
+# Prioridades (menor = antes)
+PRIORITY_ADMIN = 0    # Respuestas al admin
+PRIORITY_CHANNEL = 1  # Publicaciones/ediciones en el canal
+PRIORITY_BULK = 2     # DMs masivos a conductores
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Segundos que faltan para tener un token (0 si ya hay)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Item:
+    __slots__ = ("priority", "method", "kwargs", "future")
+
+    def __init__(self, priority, method, kwargs, future):
+        self.priority = priority
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+
+
+class SendQueue:
+    """
+    Cola central de envíos a Telegram.
+    - Un token bucket global y uno por chat respetan los límites de flood.
+    - Un chat sin tokens no bloquea a los demás: su mensaje se aparta
+      hasta que el bucket se recarga.
+    - Ante RetryAfter se pausa todo el envío el tiempo indicado y el
+      mensaje se reintenta.
+    - Las respuestas al admin salen antes que los DMs masivos.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, max_queue=MAX_QUEUE):
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.max_queue = max_queue
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retried = 0
+        self._bot = None
+        self._ready = []     # heap (prioridad, seq, item)
+        self._waiting = []   # heap (listo_en, seq, item): chat sin tokens
+        self._chats = {}     # chat_id -> TokenBucket
+        self._seq = itertools.count()
+        self._paused_until = 0
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+
+    def start(self, bot):
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def depth(self):
+        return len(self._ready) + len(self._waiting)
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retried": self.retried,
+        }
+
+    def enqueue(self, method, priority=PRIORITY_BULK, **kwargs):
+        """
+        Encola bot.<method>(**kwargs) y devuelve un Future con el resultado.
+        Los errores se registran en el log aunque nadie espere el Future.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(self._log_failure)
+        if priority == PRIORITY_BULK and self.depth() >= self.max_queue:
+            self.dropped += 1
+            future.set_exception(QueueFull(f"Cola de envío llena ({self.max_queue})"))
+            return future
+        self._push(_Item(priority, method, kwargs, future))
+        return future
+
+    async def send(self, method, priority=PRIORITY_ADMIN, **kwargs):
+        """Como enqueue(), pero espera a que el envío termine."""
+        return await self.enqueue(method, priority, **kwargs)
+
+    def _push(self, item):
+        heapq.heappush(self._ready, (item.priority, next(self._seq), item))
+        if self._wakeup:
+            self._wakeup.set()
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("Envío fallido: %r", future.exception())
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                now = time.monotonic()
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle(now)}
+            try:
+                private = int(chat_id) > 0  # Grupos y canales tienen ID negativo
+            except (TypeError, ValueError):
+                private = False  # "@canal"
+            rate = PRIVATE_CHAT_RATE if private else GROUP_CHAT_RATE
+            bucket = self._chats[chat_id] = TokenBucket(rate)
+        return bucket
+
+    async def _sleep(self, timeout):
+        # Duerme hasta `timeout` o hasta que llegue algo nuevo a la cola
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, item = heapq.heappop(self._waiting)
+                self._push(item)
+
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if not self._ready:
+                await self._sleep(self._waiting[0][0] - now if self._waiting else None)
+                continue
+
+            _, _, item = heapq.heappop(self._ready)
+            if item.future.done():
+                continue
+            chat_bucket = self._chat_bucket(item.kwargs.get("chat_id", 0))
+            chat_wait = chat_bucket.delay(now)
+            if chat_wait > 0:
+                heapq.heappush(self._waiting, (now + chat_wait, next(self._seq), item))
+                continue
+            global_wait = self.global_bucket.delay(now)
+            if global_wait > 0:
+                self._push(item)
+                await asyncio.sleep(global_wait)
+                continue
+
+            chat_bucket.take()
+            self.global_bucket.take()
+            task = asyncio.create_task(self._deliver(item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, item):
+        try:
+            result = await getattr(self._bot, item.method)(**item.kwargs)
+        except RetryAfter as e:
+            # Flood control: se pausa todo y se reintenta este mensaje
+            self.retried += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self._push(item)
+        except Exception as e:
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not item.future.done():
+                item.future.set_result(result)
+
+
+send_queue = SendQueue()
@@ -0,0 +1,246 @@
+# shift_handler.py
+
+import datetime
+import json
+import os
+
+from telegram import Update
+from telegram.ext import CallbackContext, CommandHandler, ContextTypes
+
+from config import ADMIN_ID
+from checkin_handler import publish_checkin
+from scheduler import scheduler
+
+SHIFTS_FILE = 'shifts.json'
+
+# Letras de los días (lunes = 0, como datetime.weekday())
+DAY_LETTERS = "LMXJVSD"
+
+
+def parse_days(spec):
+    """
+    "L-V" -> [0..4], "L,X,V" -> [0, 2, 4], "todos" -> [0..6].
+    Lanza ValueError si el formato no es válido.
+    """
+    spec = spec.strip().upper()
+    if spec == "TODOS":
+        return list(range(7))
+    days = set()
+    for part in spec.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            start, end = DAY_LETTERS.index(first), DAY_LETTERS.index(last)
+            if start > end:
+                raise ValueError(f"Rango de días inválido: {part}")
+            days.update(range(start, end + 1))
+        elif len(part) == 1 and part in DAY_LETTERS:
+            days.add(DAY_LETTERS.index(part))
+        else:
+            raise ValueError(f"Día inválido: {part}")
+    return sorted(days)
+
+
+def format_days(days):
+    return ",".join(DAY_LETTERS[d] for d in days)
+
+
+def next_occurrence(shift, after):
+    """Próximo (inicio, fin) del turno que empieza después de `after`."""
+    start_time = datetime.datetime.strptime(shift["start"], "%H:%M").time()
+    end_time = datetime.datetime.strptime(shift["end"], "%H:%M").time()
+    for offset in range(8):
+        day = after.date() + datetime.timedelta(days=offset)
+        start = datetime.datetime.combine(day, start_time)
+        if day.weekday() in shift["days"] and start > after:
+            return start, datetime.datetime.combine(day, end_time)
+    return None
+
+
+def last_occurrence(shift, before):
+    """Último (inicio, fin) del turno que empezó hasta `before`."""
+    start_time = datetime.datetime.strptime(shift["start"], "%H:%M").time()
+    end_time = datetime.datetime.strptime(shift["end"], "%H:%M").time()
+    for offset in range(8):
+        day = before.date() - datetime.timedelta(days=offset)
+        start = datetime.datetime.combine(day, start_time)
+        if day.weekday() in shift["days"] and start <= before:
+            return start, datetime.datetime.combine(day, end_time)
+    return before, before
+
+
+class ShiftStore:
+    """
+    Plantillas de turnos recurrentes en shifts.json:
+    {"id": "1", "days": [0..6], "start": "07:00", "end": "08:30",
+     "roster": [...], "job_id": <trabajo de la próxima apertura>}
+    """
+
+    def __init__(self, path=SHIFTS_FILE):
+        self.path = path
+        self.shifts = {}
+        self._next_id = 1
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.shifts = {shift["id"]: shift for shift in json.load(file)}
+        self._next_id = max([int(sid) for sid in self.shifts] + [0]) + 1
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as file:
+            json.dump(list(self.shifts.values()), file, indent=4, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+
+    def add(self, days, start, end, roster):
+        shift = {
+            "id": str(self._next_id),
+            "days": days,
+            "start": start,
+            "end": end,
+            "roster": roster,
+            "job_id": None,
+        }
+        self._next_id += 1
+        self.shifts[shift["id"]] = shift
+        return shift
+
+    def remove(self, shift_id):
+        return self.shifts.pop(str(shift_id), None)
+
+
+shift_store = ShiftStore()
+
+
+def schedule_next(shift, after=None):
+    """
+    Programa solo la próxima apertura del turno; al abrirse se programa
+    la siguiente (expansión perezosa, nunca hay más de un trabajo por turno).
+    """
+    start, end = next_occurrence(shift, after or datetime.datetime.now())
+    shift["job_id"] = scheduler.add(
+        "shift",
+        start,
+        data={"shift_id": shift["id"], "start": start.timestamp(), "end": end.timestamp()},
+        label=f"Turno #{shift['id']} {start:%Y-%m-%d %H:%M}-{end:%H:%M} ({len(shift['roster'])} nombres)"
+    )
+    shift_store.save()
+
+
+def resume_shifts():
+    """
+    Al arrancar (después de scheduler.start): cada turno debe tener su
+    próxima apertura programada, p.ej. si el bot se cayó al guardarla.
+    """
+    shift_store.load()
+    for shift in shift_store.shifts.values():
+        if shift.get("job_id") not in scheduler.jobs:
+            schedule_next(shift)
+
+
+async def open_shift(context: CallbackContext):
+    """Lo llama el scheduler al empezar un turno: publica el check-in."""
+    shift = shift_store.shifts.get(context.job.data["shift_id"])
+    if shift is None:
+        return  # Turno borrado
+
+    # Si el bot estuvo caído, la apertura puede llegar tarde: vale la
+    # ventana de la ocurrencia que disparó, no la de hoy. La siguiente
+    # se programa después de esa ocurrencia: si también quedó atrás se
+    # dispara en el acto y así se llega, sin repetir ninguna, a la que
+    # esté abierta ahora.
+    data = context.job.data
+    if "end" in data:
+        start = datetime.datetime.fromtimestamp(data["start"])
+        end = datetime.datetime.fromtimestamp(data["end"])
+    else:
+        # Trabajo guardado antes de que llevara la ocurrencia
+        start, end = last_occurrence(shift, datetime.datetime.now())
+    schedule_next(shift, after=start)
+    if end <= datetime.datetime.now():
+        return  # La ventana ya terminó
+    await publish_checkin(shift["roster"], end.timestamp())
+
+scheduler.register("shift", open_shift)
+
+
+# /turno <días> <HH:MM-HH:MM> y debajo la lista de nombres (solo admin)
+async def add_shift(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    lines = [line.strip() for line in update.message.text.split('\n') if line.strip()]
+    header = lines[0].split()
+    roster_list = lines[1:]
+    try:
+        if len(header) != 3 or not roster_list:
+            raise ValueError("Faltan datos")
+        days = parse_days(header[1])
+        start_str, end_str = header[2].split("-")
+        start_time = datetime.datetime.strptime(start_str, "%H:%M").time()
+        end_time = datetime.datetime.strptime(end_str, "%H:%M").time()
+        if start_time >= end_time:
+            raise ValueError("La hora de inicio debe ser anterior a la de fin.")
+    except ValueError:
+        await update.message.reply_text(
+            "❌ Formato inválido.\n"
+            "Usa:\n/turno <días> HH:MM-HH:MM\nNombre 1\nNombre 2\n...\n\n"
+            "Días: L-V, L,X,V o todos (L M X J V S D)"
+        )
+        return
+
+    shift = shift_store.add(days, f"{start_time:%H:%M}", f"{end_time:%H:%M}", roster_list)
+    schedule_next(shift)
+    job = scheduler.jobs[shift["job_id"]]
+    await update.message.reply_text(
+        f"✅ Turno #{shift['id']} guardado: {format_days(days)} {shift['start']}-{shift['end']} "
+        f"({len(roster_list)} nombres).\n"
+        f"Próxima apertura: {datetime.datetime.fromtimestamp(job['fire_at']):%Y-%m-%d %H:%M}.\n\n"
+        "Usa /turnos para verlos y /borrar_turno <id> para borrarlo."
+    )
+
+
+# /turnos — lista los turnos recurrentes (solo admin)
+async def list_shifts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    if not shift_store.shifts:
+        await update.message.reply_text("No hay turnos recurrentes.")
+        return
+
+    lines = ["🔁 Turnos recurrentes:"]
+    for shift in shift_store.shifts.values():
+        lines.append(
+            f"#{shift['id']} – {format_days(shift['days'])} {shift['start']}-{shift['end']} "
+            f"({len(shift['roster'])} nombres)"
+        )
+    await update.message.reply_text("\n".join(lines))
+
+
+# /borrar_turno <id> — borra un turno y su próxima apertura (solo admin)
+async def delete_shift(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    if not context.args:
+        await update.message.reply_text("Uso: /borrar_turno <id>")
+        return
+
+    shift_id = context.args[0].lstrip("#")
+    shift = shift_store.remove(shift_id)
+    if shift is None:
+        await update.message.reply_text(f"No existe el turno #{shift_id}.")
+        return
+    if shift.get("job_id"):
+        scheduler.cancel(shift["job_id"])
+    shift_store.save()
+    await update.message.reply_text(f"❌ Turno #{shift_id} borrado.")
+
+
+def register_shift_handlers(app):
+    app.add_handler(CommandHandler("turno", add_shift))
+    app.add_handler(CommandHandler("turnos", list_shifts))
+    app.add_handler(CommandHandler("borrar_turno", delete_shift))
@@ -0,0 +1,216 @@
+# sqlite_store.py
+
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from json_store import UserStore
+from name_index import normalize_name
+
+# Secciones de la BD JSON -> tablas
+_TABLES = {"approved": "drivers", "pending": "pending"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drivers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    username TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_drivers_name_norm ON drivers(name_norm);
+CREATE INDEX IF NOT EXISTS idx_drivers_username ON drivers(username);
+
+CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    username TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pending_name_norm ON pending(name_norm);
+CREATE INDEX IF NOT EXISTS idx_pending_username ON pending(username);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    driver_id INTEGER PRIMARY KEY REFERENCES drivers(id) ON DELETE CASCADE,
+    checked_in INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+"""
+
+# Se sube cuando cambia normalize_name para recalcular name_norm al abrir
+_SCHEMA_VERSION = 1
+
+
+class SqliteStore:
+    """
+    Backend SQLite (modo WAL). Misma interfaz que json_store.UserStore,
+    pero cada alta/baja/cambio es un UPDATE/INSERT de una fila en vez
+    de reescribir toda la BD.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self._lock = threading.RLock()
+        self._in_tx = False
+        self._saves = 0
+        self._sync_conn = None
+
+    def open(self):
+        # isolation_level=None: autocommit, las transacciones se abren a mano
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(_SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            self._renormalize()
+
+    def _renormalize(self):
+        with self._tx():
+            for table in _TABLES.values():
+                rows = self.conn.execute(f"SELECT id, name FROM {table}").fetchall()
+                self.conn.executemany(
+                    f"UPDATE {table} SET name_norm = ? WHERE id = ?",
+                    [(normalize_name(row["name"]), row["id"]) for row in rows]
+                )
+            self.conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    @property
+    def generation(self):
+        """
+        Cambia cuando la BD se reemplaza entera o la modifica otro
+        proceso (PRAGMA data_version), para invalidar índices en memoria.
+        """
+        with self._lock:
+            return (self._saves, self.conn.execute("PRAGMA data_version").fetchone()[0])
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            if self._in_tx:
+                yield
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._in_tx = True
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+            finally:
+                self._in_tx = False
+
+    def batch(self):
+        # Agrupa varios cambios en una sola transacción
+        return self._tx()
+
+    def sync(self):
+        """
+        Asegura en disco lo ya confirmado. Con synchronous=NORMAL el WAL
+        solo se sincroniza al hacer checkpoint; se usa una conexión aparte
+        para poder llamarlo desde un hilo sin bloquear a los lectores.
+        """
+        if self._sync_conn is None:
+            self._sync_conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._sync_conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    @staticmethod
+    def _row_to_info(row):
+        info = {"name": row["name"], "username": row["username"], "id": row["id"]}
+        if "checked_in" in row.keys():
+            info["checked_in"] = bool(row["checked_in"])
+        return info
+
+    def _select(self, section, where="", params=()):
+        if section == "approved":
+            sql = ("SELECT d.id, d.name, d.username, COALESCE(a.checked_in, 0) AS checked_in "
+                   "FROM drivers d LEFT JOIN attendance a ON a.driver_id = d.id " + where)
+        else:
+            sql = "SELECT id, name, username FROM pending " + where
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def section(self, section):
+        return {str(row["id"]): self._row_to_info(row) for row in self._select(section)}
+
+    def get(self, section, user_id):
+        alias = "d." if section == "approved" else ""
+        rows = self._select(section, f"WHERE {alias}id = ?", (int(user_id),))
+        return self._row_to_info(rows[0]) if rows else None
+
+    def put(self, section, user_id, value):
+        table = _TABLES[section]
+        with self._tx():
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {table} (id, name, name_norm, username) VALUES (?, ?, ?, ?)",
+                (int(user_id), value["name"], normalize_name(value["name"]), value.get("username"))
+            )
+            if section == "approved":
+                self._set_checked_in(user_id, value.get("checked_in", False))
+
+    def delete(self, section, user_id):
+        with self._tx():
+            self.conn.execute(f"DELETE FROM {_TABLES[section]} WHERE id = ?", (int(user_id),))
+
+    def update(self, section, user_id, fields):
+        table = _TABLES[section]
+        with self._tx():
+            if "name" in fields:
+                self.conn.execute(
+                    f"UPDATE {table} SET name = ?, name_norm = ? WHERE id = ?",
+                    (fields["name"], normalize_name(fields["name"]), int(user_id))
+                )
+            if "username" in fields:
+                self.conn.execute(
+                    f"UPDATE {table} SET username = ? WHERE id = ?",
+                    (fields["username"], int(user_id))
+                )
+            if section == "approved" and "checked_in" in fields:
+                self._set_checked_in(user_id, fields["checked_in"])
+
+    def _set_checked_in(self, user_id, status):
+        self.conn.execute(
+            "INSERT INTO attendance (driver_id, checked_in, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(driver_id) DO UPDATE SET checked_in = excluded.checked_in, "
+            "updated_at = excluded.updated_at",
+            (int(user_id), int(bool(status)), time.time())
+        )
+
+    def load(self):
+        return {"approved": self.section("approved"), "pending": self.section("pending")}
+
+    def save(self, data):
+        # Reemplazo completo en una sola transacción
+        self._saves += 1
+        with self._tx():
+            for table in ("attendance", "drivers", "pending"):
+                self.conn.execute(f"DELETE FROM {table}")
+            for section in ("approved", "pending"):
+                for uid, info in data.get(section, {}).items():
+                    self.put(section, uid, info)
+
+
+def import_json(json_path, sqlite_path):
+    """
+    Importa una sola vez users_db.json (snapshot + journal) a SQLite.
+    Devuelve (aprobados, pendientes) importados.
+    """
+    data = UserStore(json_path).snapshot()
+    store = SqliteStore(sqlite_path)
+    store.open()
+    store.save(data)
+    return len(data["approved"]), len(data["pending"])
+
+
+if __name__ == "__main__":
+    # Uso: python sqlite_store.py [users_db.json] [users.db]
+    from config import DB_FILE, SQLITE_FILE
+    json_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    sqlite_path = sys.argv[2] if len(sys.argv) > 2 else SQLITE_FILE
+    approved, pending = import_json(json_path, sqlite_path)
+    print(f"Importados {approved} aprobados y {pending} pendientes a {sqlite_path}")
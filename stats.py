@@ -0,0 +1,189 @@
+# stats.py
+
+import asyncio
+
+import numpy as np
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from config import ADMIN_ID
+from attendance import attendance
+from database import get_user
+
+# Conductores que se muestran en /stats (los de peor asistencia primero)
+STATS_TOP = 20
+
+
+
+class AttendanceStats:
+    """
+    Estadísticas por conductor sobre las sesiones cerradas.
+    - Cada sesión se guarda en columnas (conductor, presente, minutos
+      desde la apertura) que se concatenan en arrays de NumPy.
+    - Todo el cálculo es vectorizado (bincount, lexsort, cumsum).
+    - El resultado se cachea y solo se recalcula cuando se cierra una
+      sesión nueva (attendance.register_close).
+    """
+
+    def __init__(self):
+        self.driver_ids = []    # índice -> user_id
+        self._driver_index = {}
+        self._sids = set()
+        self._chunks = []       # [(conductor, presente, minutos)] por sesión
+        self._starts = []       # inicio de cada chunk (orden cronológico)
+        self._built = False
+        self._lock = asyncio.Lock()
+        self._result = None
+
+    def _driver(self, user_id):
+        index = self._driver_index.get(user_id)
+        if index is None:
+            index = self._driver_index[user_id] = len(self.driver_ids)
+            self.driver_ids.append(user_id)
+        return index
+
+    def add_session(self, session):
+        """Suma una sesión cerrada e invalida el resultado cacheado."""
+        if self._built:
+            self._add(session)
+
+    def _add(self, session):
+        if session.sid in self._sids or not len(session):
+            return
+        self._sids.add(session.sid)
+        n = len(session)
+        drivers = np.fromiter((self._driver(uid) for uid in session.driver_ids), np.int32, n)
+        present = np.unpackbits(np.frombuffer(session.bits, np.uint8), bitorder="little")[:n].astype(bool)
+        minutes = (np.frombuffer(session.times, np.float64) - session.start) / 60
+        minutes[~present] = np.nan
+        self._chunks.append((drivers, present, minutes))
+        self._starts.append(session.start)
+        self._result = None
+
+    def load_history(self):
+        """
+        Carga todo el historial de disco, sesión a sesión. Se llama en un
+        hilo; mientras tanto add_session() no hace nada (ver ensure_built).
+        """
+        for session in attendance.iter_sessions():
+            if session.closed:
+                self._add(session)
+
+    async def ensure_built(self):
+        async with self._lock:
+            if self._built:
+                return
+            await asyncio.to_thread(self.load_history)
+            self._built = True
+            # Las sesiones cerradas mientras se leía el disco
+            for session in list(attendance.sessions.values()):
+                if session.closed:
+                    self._add(session)
+
+    def _columns(self):
+        # Filas ordenadas por inicio de sesión (las sesiones pueden cerrarse
+        # en otro orden), para que las rachas sigan la cronología
+        order = np.argsort(np.asarray(self._starts), kind="stable")
+        chunks = [self._chunks[i] for i in order]
+        session = np.repeat(np.arange(len(chunks), dtype=np.int32), [len(c[0]) for c in chunks])
+        drivers = np.concatenate([c[0] for c in chunks])
+        present = np.concatenate([c[1] for c in chunks])
+        minutes = np.concatenate([c[2] for c in chunks])
+        return session, drivers, present, minutes
+
+    def compute(self):
+        """
+        Devuelve un dict con arrays por conductor (índice = self.driver_ids):
+        sessions, attended, rate, median_minutes, current_streak, longest_streak.
+        """
+        if self._result is not None:
+            return self._result
+        size = len(self.driver_ids)
+        if not self._chunks:
+            return None
+        session, drivers, present, minutes = self._columns()
+
+        sessions = np.bincount(drivers, minlength=size)
+        attended = np.bincount(drivers, weights=present, minlength=size).astype(np.int64)
+        rate = attended / np.maximum(sessions, 1)
+
+        # Mediana por conductor: se ordena (conductor, minutos) y se toma
+        # el centro de cada grupo
+        median = np.full(size, np.nan)
+        p_drivers, p_minutes = drivers[present], minutes[present]
+        if len(p_drivers):
+            order = np.lexsort((p_minutes, p_drivers))
+            p_drivers, p_minutes = p_drivers[order], p_minutes[order]
+            groups, first, counts = np.unique(p_drivers, return_index=True, return_counts=True)
+            median[groups] = (p_minutes[first + (counts - 1) // 2] + p_minutes[first + counts // 2]) / 2
+
+        # Rachas de faltas: filas por (conductor, sesión); cada asistencia o
+        # cambio de conductor empieza una racha nueva
+        order = np.lexsort((session, drivers))
+        s_drivers, absent = drivers[order], ~present[order]
+        new_run = np.ones(len(order), dtype=bool)
+        new_run[1:] = (s_drivers[1:] != s_drivers[:-1]) | ~absent[1:]
+        run_id = np.cumsum(new_run) - 1
+        run_length = np.bincount(run_id, weights=absent).astype(np.int64)
+        longest = np.zeros(size, dtype=np.int64)
+        np.maximum.at(longest, s_drivers[new_run], run_length)
+        last = np.flatnonzero(np.append(s_drivers[1:] != s_drivers[:-1], True))
+        current = np.zeros(size, dtype=np.int64)
+        current[s_drivers[last]] = np.where(absent[last], run_length[run_id[last]], 0)
+
+        self._result = {
+            "sessions": sessions,
+            "attended": attended,
+            "rate": rate,
+            "median_minutes": median,
+            "current_streak": current,
+            "longest_streak": longest,
+            "total_sessions": len(self._chunks),
+            "total_events": len(drivers),
+        }
+        return self._result
+
+
+attendance_stats = AttendanceStats()
+attendance.register_close(attendance_stats.add_session)
+
+
+def render_stats(result, driver_ids, top=STATS_TOP):
+    if result is None:
+        return "Todavía no hay sesiones cerradas."
+    lines = [
+        "📊 Asistencia",
+        f"Sesiones: {result['total_sessions']} – registros: {result['total_events']}",
+        f"Asistencia global: {result['attended'].sum() / max(result['total_events'], 1):.0%}",
+        "",
+        "Conductor – asistencia – mediana – racha actual/máx. de faltas",
+    ]
+    active = np.flatnonzero(result["sessions"])
+    # Peor asistencia primero; a igualdad, la racha actual más larga
+    order = active[np.lexsort((-result["current_streak"][active], result["rate"][active]))]
+    for index in order[:top]:
+        info = get_user(driver_ids[index])
+        name = info["name"] if info else driver_ids[index]
+        median = result["median_minutes"][index]
+        median_text = f"{median:.1f} min" if not np.isnan(median) else "—"
+        lines.append(
+            f"{name} – {result['rate'][index]:.0%} ({result['attended'][index]}/{result['sessions'][index]})"
+            f" – {median_text} – {result['current_streak'][index]}/{result['longest_streak'][index]}"
+        )
+    if len(order) > top:
+        lines.append(f"... y {len(order) - top} más")
+    return "\n".join(lines)
+
+
+# /stats — estadísticas de asistencia por conductor (solo admin)
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return
+
+    await attendance_stats.ensure_built()
+    result = attendance_stats.compute()
+    await update.message.reply_text(render_stats(result, attendance_stats.driver_ids))
+
+
+def register_stats_handlers(app):
+    app.add_handler(CommandHandler("stats", show_stats))
@@ -0,0 +1,66 @@
+# tests/test_json_store.py
+
+import atexit
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_store import UserStore  # noqa: E402
+
+
+class ExternalEditTest(unittest.TestCase):
+    """Ediciones a mano de users_db.json con el bot andando."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "users_db.json")
+        with open(self.path, "w") as file:
+            json.dump({"approved": {"1": {"name": "Ana"}}, "pending": {}}, file)
+        self.store = UserStore(self.path)
+        self.store.open()
+        atexit.unregister(self.store.close)
+
+    def tearDown(self):
+        self.store.journal.close()
+        self.dir.cleanup()
+
+    def _write_external(self, text):
+        # Otro mtime/tamaño que el snapshot que conoce el store
+        time.sleep(0.01)
+        with open(self.path, "w") as file:
+            file.write(text)
+
+    def test_partial_write_keeps_memory_and_journal(self):
+        self.store.put("approved", "2", {"name": "Beto"})  # solo en el journal
+        self._write_external('{"approved": {"1": {"na')
+
+        self.assertEqual(set(self.store.section("approved")), {"1", "2"})
+        self.assertEqual(glob.glob(self.path + ".corrupt-*"), [])
+        self.assertTrue(any(r["id"] == "2" for r in self.store.journal.read(self.store.journal.path)))
+
+        # Cuando la edición termina, manda el archivo editado
+        self._write_external(json.dumps({"approved": {"1": {"name": "Ana María"}}, "pending": {}}))
+        self.assertEqual(self.store.get("approved", "1"), {"name": "Ana María"})
+
+    def test_corrupt_snapshot_is_quarantined_at_startup(self):
+        self.store.put("approved", "2", {"name": "Beto"})
+        self.store.journal.close()
+        with open(self.path, "w") as file:
+            file.write("{roto")
+
+        store = UserStore(self.path)
+        store.open()
+        atexit.unregister(store.close)
+        self.store = store
+        self.assertEqual(len(glob.glob(self.path + ".corrupt-*")), 1)
+        self.assertEqual(set(store.section("approved")), {"2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
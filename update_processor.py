@@ -0,0 +1,79 @@
+# update_processor.py
+
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Cupo del semáforo de PTB: el límite real lo pone _slots, dentro del
+# lock de cada usuario
+UNBOUNDED = 2 ** 31 - 1
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Procesa updates de usuarios distintos en paralelo (hasta
+    max_concurrent_updates) y los de un mismo usuario en orden.
+    - La clave es el usuario (los taps del canal vienen todos del mismo
+      chat pero de usuarios distintos); si no hay usuario, el chat.
+    - Un asyncio.Lock por clave, que se descarta cuando nadie lo espera.
+      Los locks de asyncio despiertan en orden de llegada, así que dos
+      updates del mismo usuario se ejecutan en el orden en que llegaron.
+    - El cupo de concurrencia se toma después del lock del usuario: un
+      update que espera a otro del mismo usuario no ocupa lugar, y una
+      ráfaga de taps repetidos no frena a los demás. Por eso el semáforo
+      de PTB va sin límite (max_concurrent_updates informa UNBOUNDED).
+    - observe() registra funciones que ven cada update al llegar, antes
+      de esperar turno (p.ej. recorder.py).
+    """
+
+    __slots__ = ("_locks", "_observers", "_slots")
+
+    def __init__(self, max_concurrent_updates):
+        super().__init__(UNBOUNDED)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks = {}  # clave -> [lock, usuarios esperando o dentro]
+        self._observers = []
+
+    def observe(self, fn):
+        self._observers.append(fn)
+
+    @staticmethod
+    def _key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return ("user", update.effective_user.id)
+            if update.effective_chat:
+                return ("chat", update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        # process_update() de PTB es final; como su semáforo no tiene
+        # límite, aquí se llega al instante y los observadores ven la
+        # hora de llegada
+        for fn in self._observers:
+            fn(update)
+
+        key = self._key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self._locks.clear()
@@ -0,0 +1,114 @@
+# write_queue.py
+
+import asyncio
+import logging
+from contextlib import ExitStack
+
+import database
+
+# Ventana para juntar cambios en un mismo commit (segundos)
+BATCH_WINDOW = 0.02
+# Máximo de cambios por commit
+MAX_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    Único escritor de la BD para las ráfagas de check-in.
+    - submit() encola un cambio y espera a que esté en disco.
+    - La tarea de fondo junta todo lo que llega dentro de BATCH_WINDOW,
+      lo aplica de una vez (database.batch()) y hace un solo fsync /
+      checkpoint (database.sync()) en un hilo aparte.
+    - Otros almacenes que escriben desde la cola (p.ej. la asistencia
+      por sesión) se suman al lote con register_batch() y a ese fsync
+      con register_sync().
+    - Cada llamador recibe el resultado (o la excepción) de su cambio.
+    """
+
+    def __init__(self, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self._syncs = [database.sync]
+        self._batches = [database.batch]
+
+    def register_batch(self, fn):
+        """fn() devuelve un context manager que envuelve cada lote."""
+        if fn not in self._batches:
+            self._batches.append(fn)
+
+    def register_sync(self, fn):
+        if fn not in self._syncs:
+            self._syncs.append(fn)
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, fn, *args):
+        """Ejecuta fn(*args) en el próximo commit y devuelve su resultado."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _sync(self):
+        for fn in self._syncs:
+            fn()
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            results = []
+            try:
+                # Los cambios se aplican en el hilo del event loop (son
+                # operaciones en memoria / una transacción); solo el fsync
+                # va a un hilo.
+                with ExitStack() as stack:
+                    for begin in self._batches:
+                        stack.enter_context(begin())
+                    for fn, args, _ in batch:
+                        try:
+                            results.append((True, fn(*args)))
+                        except Exception as e:
+                            results.append((False, e))
+                await asyncio.to_thread(self._sync)
+            except Exception as e:
+                logger.exception("Error al confirmar %d cambios", len(batch))
+                results = [(False, e)] * len(batch)
+
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+
+write_queue = WriteQueue()